@@ -0,0 +1,46 @@
+# Build the simplified boundary variants (/layers/geojson "resolution" / "zoom") into _assets/shapefiles_geojson_simplified
+# Without them the boundary store simplifies at startup; restart the app after rebuilding
+# USAGE: python -m api_layers.commands.build_boundary_simplifications [--resolutions high medium low]
+import argparse
+import shutil
+import time
+import shapely
+from api_layers.utils.boundary_store import RESOLUTIONS, boundary_store, simplify_units
+
+
+def count_coordinates(gdfs):
+    return sum(int(shapely.get_num_coordinates(gdf.geometry.to_numpy()).sum()) for gdf in gdfs.values())
+
+
+def main():
+    simplified_resolutions = [resolution for (resolution, tolerance) in RESOLUTIONS.items() if tolerance]
+    parser = argparse.ArgumentParser(description="Build simplified admin boundary variants")
+    parser.add_argument("--resolutions", nargs="*", default=simplified_resolutions, choices=simplified_resolutions)
+    args = parser.parse_args()
+
+    sources = boundary_store.read_units(boundary_store.geojson_data_dir)
+    for resolution in args.resolutions:
+        started = time.perf_counter()
+        variant_dir = boundary_store.get_variant_dir(resolution)
+        tmp_dir = variant_dir.with_name(f".{resolution}.tmp")
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        for (admin_level, gdfs) in sources.items():
+            if not gdfs:
+                continue
+            simplified = simplify_units(gdfs, RESOLUTIONS[resolution])
+            for (rel_path, gdf) in simplified.items():
+                path = tmp_dir / rel_path
+                path.parent.mkdir(parents=True, exist_ok=True)
+                path.write_text(gdf.to_json(separators=(",", ":")), encoding="utf-8")
+            print(
+                f"{resolution} {admin_level}: {len(gdfs)} file(s), "
+                f"{count_coordinates(gdfs)} -> {count_coordinates(simplified)} coordinates"
+            )
+        # Swapped in whole - the store never reads a half-written variant
+        shutil.rmtree(variant_dir, ignore_errors=True)
+        tmp_dir.rename(variant_dir)
+        print(f"{resolution}: {variant_dir} ({time.perf_counter() - started:.1f}s)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,35 @@
+# Pre-generate the admin boundary vector tiles (/layers/boundaries/{z}/{x}/{y}.mvt) into the on-disk tile cache
+# USAGE: python -m api_layers.commands.build_boundary_tiles [--min-zoom 0] [--max-zoom 10] [--workers 4] [--force]
+import argparse
+import time
+from concurrent.futures import ProcessPoolExecutor
+from api_layers.utils.boundary_tiles import BoundaryTileProc
+
+
+def build_tile(args):
+    (z, x, y, force) = args
+    tile = BoundaryTileProc(z=z, x=x, y=y).prep_tile(force=force)
+    return len(tile)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Pre-generate admin boundary vector tiles")
+    parser.add_argument("--min-zoom", type=int, default=0)
+    parser.add_argument("--max-zoom", type=int, default=10)
+    parser.add_argument("--workers", type=int, default=4, help="Worker processes")
+    parser.add_argument("--force", action="store_true", help="Regenerate tiles already in the cache")
+    args = parser.parse_args()
+
+    proc = BoundaryTileProc()
+    with ProcessPoolExecutor(max_workers=args.workers) as executor:
+        for z in range(args.min_zoom, args.max_zoom + 1):
+            started = time.perf_counter()
+            (x_min, x_max, y_min, y_max) = proc.get_tile_range(z)
+            jobs = [(z, x, y, args.force) for x in range(x_min, x_max + 1) for y in range(y_min, y_max + 1)]
+            sizes = list(executor.map(build_tile, jobs, chunksize=16))
+            elapsed = time.perf_counter() - started
+            print(f"z{z}: {len(jobs)} tiles, {sum(sizes) / 1024 ** 2:.1f} MiB, {elapsed:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
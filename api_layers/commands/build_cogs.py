@@ -0,0 +1,121 @@
+# Convert the rasters under DATA_ROOT_DIR to tiled Cloud-Optimized GeoTIFFs with internal overviews
+# USAGE: python -m api_layers.commands.build_cogs --in-place [--workers 8] [--report cog_report.json]
+#        python -m api_layers.commands.build_cogs --out-dir /data/acasa_cog
+import argparse
+import json
+import os
+import time
+import rasterio
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+from rasterio import shutil as rio_shutil
+from rasterio.errors import RasterioError
+from settings import env
+from api_layers.utils.tif_picker import RASTER_FOLDERS
+
+
+BLOCKSIZE = 512
+
+
+def validate_cog(path):
+    # Empty list when the file is a tiled COG with overviews; otherwise the reasons it is not
+    errors = []
+    try:
+        with rasterio.open(path) as src:
+            if src.tags(ns="IMAGE_STRUCTURE").get("LAYOUT") != "COG":
+                errors.append("not in COG layout")
+            if not src.profile.get("tiled"):
+                errors.append("not tiled")
+            if max(src.width, src.height) > BLOCKSIZE and not src.overviews(1):
+                errors.append("no internal overviews")
+    except RasterioError as exc:
+        errors.append(f"unreadable: {exc}")
+    return errors
+
+
+def convert_to_cog(source_path, target_path):
+    target_path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = target_path.with_name(f".{target_path.stem}.{os.getpid()}.tmp.tif")
+    try:
+        rio_shutil.copy(
+            source_path, tmp_path,
+            driver="COG",
+            BLOCKSIZE=BLOCKSIZE,
+            COMPRESS="DEFLATE",
+            PREDICTOR="YES",
+            OVERVIEW_RESAMPLING="NEAREST", # categorical layers
+            BIGTIFF="IF_SAFER",
+        )
+        errors = validate_cog(tmp_path)
+        if errors:
+            return errors
+        os.replace(tmp_path, target_path) # atomic - the API never sees a half written raster
+        return []
+    finally:
+        if tmp_path.exists():
+            tmp_path.unlink()
+
+
+def process_raster(source_path, target_path, force):
+    started = time.perf_counter()
+    result = {
+        "source_file": str(source_path),
+        "target_file": str(target_path),
+        "size_before": source_path.stat().st_size,
+    }
+    existing_errors = validate_cog(target_path) if target_path.exists() else ["missing"]
+    is_stale = target_path.exists() and target_path.stat().st_mtime < source_path.stat().st_mtime
+    if not existing_errors and not is_stale and not force:
+        result.update({"status": "skipped", "errors": [], "size_after": target_path.stat().st_size})
+    else:
+        try:
+            errors = convert_to_cog(source_path, target_path)
+        except RasterioError as exc:
+            errors = [f"conversion failed: {exc}"]
+        result.update({
+            "status": "failed" if errors else "converted",
+            "errors": errors,
+            "size_after": target_path.stat().st_size if target_path.exists() else None,
+        })
+    result["seconds"] = round(time.perf_counter() - started, 2)
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Convert DATA_ROOT_DIR rasters to validated COGs")
+    target = parser.add_mutually_exclusive_group(required=True)
+    target.add_argument("--in-place", action="store_true", help="Atomically replace each source raster")
+    target.add_argument("--out-dir", type=Path, help="Write COGs to a mirrored tree under this folder")
+    parser.add_argument("--folders", nargs="*", default=RASTER_FOLDERS, help="Folders under DATA_ROOT_DIR to scan")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="Parallel conversion processes")
+    parser.add_argument("--force", action="store_true", help="Rebuild files that already validate as COGs")
+    parser.add_argument("--report", type=Path, default=Path("cog_report.json"))
+    args = parser.parse_args()
+
+    data_root_dir = Path(env.get("DATA_ROOT_DIR"))
+    source_paths = [path for folder in args.folders for path in sorted((data_root_dir / folder).rglob("*.tif"))]
+    print(f"Found {len(source_paths)} raster(s), converting with {args.workers} worker(s)")
+    results = []
+    with ProcessPoolExecutor(max_workers=args.workers) as executor:
+        futures = {
+            executor.submit(
+                process_raster, source_path,
+                source_path if args.in_place else args.out_dir / source_path.relative_to(data_root_dir),
+                args.force,
+            ): source_path
+            for source_path in source_paths
+        }
+        for future in as_completed(futures):
+            result = future.result()
+            results.append(result)
+            print(f"[{result['status']}] {Path(result['source_file']).relative_to(data_root_dir)} ({result['seconds']}s)")
+    results.sort(key=lambda result: result["source_file"])
+    summary = {status: sum(result["status"] == status for result in results) for status in ["converted", "skipped", "failed"]}
+    args.report.write_text(json.dumps({"summary": summary, "files": results}, indent=2))
+    print(f"{summary} - report written to {args.report}")
+    if summary["failed"]:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
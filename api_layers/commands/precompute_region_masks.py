@@ -0,0 +1,79 @@
+# Precompute region masks for every admin unit on every raster grid found under DATA_ROOT_DIR
+# USAGE: python -m api_layers.commands.precompute_region_masks [--force] [--folders "Hazards-final-struc" ...]
+import argparse
+import time
+import rasterio
+from pathlib import Path
+from rasterio.errors import RasterioIOError
+from settings import env
+from settings.database import SessionLocal
+from api_layers.exceptions import LayerDataException
+from api_lookups.models import LkpCountry, LkpState, LkpDistrict
+from api_layers.utils import GeoProc
+from api_layers.utils.tif_picker import RASTER_FOLDERS
+from api_layers.utils.region_masks import RasterGrid, region_mask_cache
+
+
+def find_grids(data_root_dir, folders):
+    # One representative raster per distinct grid (transform + shape + crs)
+    grids = {}
+    for folder in folders:
+        for path in sorted((data_root_dir / folder).rglob("*.tif")):
+            try:
+                with rasterio.open(path) as src:
+                    grid = RasterGrid.from_dataset(src)
+            except RasterioIOError:
+                print(f"SKIPPED (unreadable): {path}")
+                continue
+            grids.setdefault(grid.get_grid_id(), (grid, path))
+    return grids
+
+
+def list_admin_units(db):
+    units = [("total", None)]
+    units += [("country", row.id) for row in db.query(LkpCountry).filter(LkpCountry.status)]
+    units += [("state", row.id) for row in db.query(LkpState).filter(LkpState.status)]
+    units += [("district", row.id) for row in db.query(LkpDistrict).filter(LkpDistrict.status)]
+    return units
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Precompute admin region masks for all raster grids")
+    parser.add_argument("--folders", nargs="*", default=RASTER_FOLDERS, help="Folders under DATA_ROOT_DIR to scan")
+    parser.add_argument("--force", action="store_true", help="Recompute masks even when cached on disk")
+    args = parser.parse_args()
+
+    data_root_dir = Path(env.get("DATA_ROOT_DIR"))
+    grids = find_grids(data_root_dir, args.folders)
+    print(f"Found {len(grids)} distinct raster grid(s)")
+    db = SessionLocal()
+    try:
+        units = list_admin_units(db)
+        for grid_id, (grid, sample_path) in grids.items():
+            started = time.perf_counter()
+            empty_units, failed_units = 0, 0
+            for (admin_level, admin_level_id) in units:
+                proc = GeoProc(db=db, admin_level=admin_level, admin_level_id=admin_level_id)
+                path = region_mask_cache.get_path(grid_id, admin_level, admin_level_id)
+                if args.force or not path.exists():
+                    try:
+                        region_mask = region_mask_cache.compute(grid, proc.get_region_geoms())
+                    except LayerDataException as e:
+                        print(f"SKIPPED {admin_level} {admin_level_id}: {e}")
+                        failed_units += 1
+                        continue
+                    region_mask_cache.save(path, region_mask)
+                else:
+                    region_mask = region_mask_cache.load(path)
+                empty_units += region_mask.is_empty
+            elapsed = time.perf_counter() - started
+            print(
+                f"{grid_id} ({sample_path.relative_to(data_root_dir)}): "
+                f"{len(units)} units, {empty_units} outside grid, {failed_units} skipped, {elapsed:.1f}s"
+            )
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
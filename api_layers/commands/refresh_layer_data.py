@@ -0,0 +1,359 @@
+# Regenerate tbl_risk_data / tbl_impact_data / tbl_adapt_* class aggregates straight from the rasters
+# Every raster the TIFPicker conventions can produce is read once, in a worker process, and summarised for all
+# admin units in a single pass; rows are upserted in batched executemany chunks
+# USAGE: python -m api_layers.commands.refresh_layer_data [--layer-types risk impact adaptation] [--workers 8]
+#        [--population-file "Population/rural_population.tif"] [--batch-size 1000] [--dry-run]
+import argparse
+import os
+import time
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+from sqlalchemy import and_, insert, or_, update
+from settings import env
+from settings.database import SessionLocal
+from api_layers.exceptions import LayerDataException
+from api_lookups.models import (
+    LkpAnalysisScope, LkpVisualizationScale, LkpCommodity, LkpCountry, LkpState, LkpDistrict,
+    LkpRisk, LkpRiskColor, LkpImpact, LkpAdapt, LkpAdaptCropColor, LkpAdaptCropOptcode, LkpAdaptLivestockColor,
+)
+from api_layers.models import TblRiskData, TblImpactData, TblAdaptCropData, TblAdaptLivestockData
+from api_layers.utils import GeoProc, TIFPicker
+from api_layers.utils.dataset_pool import dataset_pool
+from api_layers.utils.region_masks import RasterGrid, region_mask_cache
+from api_layers.utils.zonal_stats import get_row_areas, read_aligned, summarize_classes
+
+
+TABLES = {
+    "risk": TblRiskData,
+    "impact": TblImpactData,
+    "adapt_crop": TblAdaptCropData,
+    "adapt_livestock": TblAdaptLivestockData,
+}
+DIMENSION_FIELDS = [
+    "commodity_id", "intensity_metric_id", "visualization_scale_id",
+    "climate_scenario_id", "year", "change_metric_id",
+]
+LOCATION_FIELDS = ["country_id", "state_id", "district_id"]
+LAYER_FIELDS = {
+    "risk": ["risk_suffix_id"],
+    "impact": ["impact_optcode_id"],
+    "adapt_crop": ["adaptation_prefix_id", "adaptation_optcode_id"],
+    "adapt_livestock": ["adaptation_optcode_id"],
+}
+# Raster class value -> c_*/pop_* field suffix per table, in the order of the legend readers' field lists
+# (None: no field, the class is not counted)
+ADAPT_CLASS_FIELDS = [None, "vlow", "low", "med", "high", "vhigh", "uns", "nil"]
+CLASS_FIELDS = {
+    "risk": ["nil", "vlow", "low", "med", "high", "vhigh"],
+    "impact": [None, "vlow", "low", "med", "high", "vhigh", "nil"],
+    "adapt_crop": ADAPT_CLASS_FIELDS,
+    "adapt_livestock": ADAPT_CLASS_FIELDS,
+}
+
+# Per worker process - DB session, admin units and extent/population rasters resampled per grid
+worker_state = {}
+
+
+def list_admin_units(db):
+    # (admin_level, admin_level_id, location columns of the table row)
+    units = [("total", None, {"country_id": None, "state_id": None, "district_id": None})]
+    units += [
+        ("country", row.id, {"country_id": row.id, "state_id": None, "district_id": None})
+        for row in db.query(LkpCountry).filter(LkpCountry.status)
+    ]
+    units += [
+        ("state", row.id, {"country_id": row.country_id, "state_id": row.id, "district_id": None})
+        for row in db.query(LkpState).filter(LkpState.status)
+    ]
+    units += [
+        ("district", row.id, {"country_id": row.country_id, "state_id": row.state_id, "district_id": row.id})
+        for row in db.query(LkpDistrict).filter(LkpDistrict.status)
+    ]
+    return units
+
+
+def list_pickers(db, layer_types):
+    # (table, TIFPicker kwargs, layer columns) for every layer selection the UI can make
+    scale_ids = [row.id for row in db.query(LkpVisualizationScale).filter(LkpVisualizationScale.status)]
+    scope_ids = [row.id for row in db.query(LkpAnalysisScope).filter(LkpAnalysisScope.status)]
+    commodities = db.query(LkpCommodity).filter(LkpCommodity.status).all()
+    pickers = []
+    for visualization_scale_id in scale_ids:
+        common = {"visualization_scale_id": visualization_scale_id}
+        if "risk" in layer_types:
+            if 2 in scope_ids:
+                # Regional analysis - no commodity
+                for risk_obj in db.query(LkpRisk).filter(LkpRisk.commodity_type_id == None, LkpRisk.commodity_id == None):
+                    risk_suffix_obj = db.query(LkpRiskColor).filter(LkpRiskColor.suffix == risk_obj.suffix).first()
+                    if not risk_suffix_obj:
+                        continue
+                    pickers.append(("risk", {
+                        **common, "layer_type": "risk", "analysis_scope_id": 2, "risk_id": risk_obj.id,
+                    }, {"commodity_id": None, "risk_suffix_id": risk_suffix_obj.id}))
+            for commodity_obj in commodities:
+                risks = db.query(LkpRisk).filter(and_(
+                    LkpRisk.commodity_type_id == commodity_obj.type_id,
+                    or_(LkpRisk.commodity_id == commodity_obj.id, LkpRisk.commodity_id == None),
+                ))
+                for risk_obj in risks:
+                    risk_suffix_obj = db.query(LkpRiskColor).filter(LkpRiskColor.suffix == risk_obj.suffix).first()
+                    if not risk_suffix_obj:
+                        continue
+                    pickers.append(("risk", {
+                        **common, "layer_type": "risk", "analysis_scope_id": 1,
+                        "commodity_id": commodity_obj.id, "risk_id": risk_obj.id,
+                    }, {"risk_suffix_id": risk_suffix_obj.id}))
+        if "impact" in layer_types:
+            for commodity_obj in commodities:
+                for impact_obj in db.query(LkpImpact).filter(LkpImpact.status):
+                    pickers.append(("impact", {
+                        **common, "layer_type": "impact", "analysis_scope_id": 1,
+                        "commodity_id": commodity_obj.id, "impact_id": impact_obj.id,
+                    }, {"impact_optcode_id": impact_obj.id}))
+        if "adaptation" in layer_types:
+            for commodity_obj in commodities:
+                if commodity_obj.type.type == "Crops":
+                    adaptations = db.query(LkpAdapt).filter(and_(
+                        LkpAdapt.commodity_type_id == commodity_obj.type_id,
+                        or_(LkpAdapt.commodity_id == commodity_obj.id, LkpAdapt.commodity_id == None),
+                    ))
+                    # "Adaptation Benefits" points at the impact Productivity rasters - refreshed with impacts
+                    croptabs = db.query(LkpAdaptCropColor).filter(LkpAdaptCropColor.tab_name != "Adaptation Benefits").all()
+                    for adap_obj in adaptations:
+                        optcode_obj = db.query(LkpAdaptCropOptcode).filter(LkpAdaptCropOptcode.optcode == adap_obj.optcode).first()
+                        if not optcode_obj:
+                            continue
+                        for cpfx_obj in croptabs:
+                            pickers.append(("adapt_crop", {
+                                **common, "layer_type": "adaptation", "analysis_scope_id": 1,
+                                "commodity_id": commodity_obj.id, "adaptation_id": adap_obj.id,
+                                "adaptation_croptab_id": cpfx_obj.id,
+                            }, {"adaptation_prefix_id": cpfx_obj.id, "adaptation_optcode_id": optcode_obj.id}))
+                elif commodity_obj.type.type == "Livestock":
+                    adaptations = db.query(LkpAdapt).filter(and_(
+                        LkpAdapt.commodity_type_id == commodity_obj.type_id,
+                        LkpAdapt.commodity_id == commodity_obj.id,
+                    ))
+                    for adap_obj in adaptations:
+                        lsufx_obj = db.query(LkpAdaptLivestockColor).filter(LkpAdaptLivestockColor.suffix == adap_obj.optcode).first()
+                        if not lsufx_obj:
+                            continue
+                        pickers.append(("adapt_livestock", {
+                            **common, "layer_type": "adaptation", "analysis_scope_id": 1,
+                            "commodity_id": commodity_obj.id, "adaptation_id": adap_obj.id,
+                        }, {"adaptation_optcode_id": lsufx_obj.id}))
+    return pickers
+
+
+def list_raster_jobs(db, layer_types, data_root_dir):
+    # One job per existing raster: its table, dimension columns and commodity extent raster (if any)
+    jobs = {}
+    for (table, picker_kwargs, layer_values) in list_pickers(db, layer_types):
+        picked = TIFPicker(db=db, **picker_kwargs).execute()
+        commodity_obj = db.query(LkpCommodity).filter(LkpCommodity.id == picker_kwargs.get("commodity_id")).first()
+        weight_file = (Path("Crop Masks/Extent") / f"{commodity_obj.commodity}.tif").as_posix() if commodity_obj else None
+        for raster_file in picked["raster_files"]:
+            # The legend/table readers only know their own layer type (impact rasters listed under adaptations are skipped)
+            if not raster_file["exists"] or raster_file["layer_type"] != picker_kwargs["layer_type"]:
+                continue
+            dimensions = {
+                "commodity_id": picker_kwargs.get("commodity_id"),
+                "intensity_metric_id": raster_file["intensity_metric_id"],
+                "visualization_scale_id": picker_kwargs["visualization_scale_id"],
+                "climate_scenario_id": raster_file["climate_scenario_id"],
+                "year": raster_file["year"],
+                "change_metric_id": raster_file["change_metric_id"],
+                **layer_values,
+            }
+            jobs.setdefault((table, raster_file["source_file"], tuple(sorted(dimensions.items()))), {
+                "table": table,
+                "source_file": raster_file["source_file"],
+                "weight_file": weight_file if weight_file and (data_root_dir / weight_file).exists() else None,
+                "dimensions": dimensions,
+            })
+    return list(jobs.values())
+
+
+def init_worker(units, data_root_dir, population_file):
+    worker_state.update({
+        "db": SessionLocal(),
+        "units": units,
+        "data_root_dir": data_root_dir,
+        "population_file": population_file,
+        "aligned": {}, # {(relative path, grid id): values on that grid}
+    })
+
+
+def get_aligned(relative_path, grid, src):
+    aligned_key = (relative_path, grid.get_grid_id())
+    if aligned_key not in worker_state["aligned"]:
+        if len(worker_state["aligned"]) >= 8:
+            worker_state["aligned"].pop(next(iter(worker_state["aligned"])))
+        worker_state["aligned"][aligned_key] = read_aligned(
+            worker_state["data_root_dir"] / relative_path, src.bounds, (src.height, src.width)
+        )
+    return worker_state["aligned"][aligned_key]
+
+
+def get_class_values(table, classes, prefix, value_key):
+    class_fields = CLASS_FIELDS[table]
+    values = {f"{prefix}_{field}": 0.0 for field in class_fields if field}
+    for row in classes:
+        if row["class_value"] < len(class_fields) and class_fields[row["class_value"]]:
+            values[f"{prefix}_{class_fields[row['class_value']]}"] = row[value_key]
+    return values
+
+
+def process_raster(job):
+    # One full read of the raster, then every admin unit is a crop + bincount over its cached region mask
+    started = time.perf_counter()
+    db = worker_state["db"]
+    population_file = worker_state["population_file"]
+    with dataset_pool.open(worker_state["data_root_dir"] / job["source_file"]) as src:
+        grid = RasterGrid.from_dataset(src)
+        band = src.read(1)
+        row_areas = get_row_areas(src.transform, src.crs, 0, src.height)
+        valid = ~np.isnan(band)
+        if src.nodata is not None and not np.isnan(src.nodata):
+            valid &= band != src.nodata
+        weights = get_aligned(job["weight_file"], grid, src) if job["weight_file"] else None
+        population = get_aligned(population_file, grid, src) if population_file else None
+    rows, skipped = [], []
+    for (admin_level, admin_level_id, location) in worker_state["units"]:
+        proc = GeoProc(db=db, admin_level=admin_level, admin_level_id=admin_level_id)
+        try:
+            region_mask = region_mask_cache.get(grid, admin_level, admin_level_id, proc.get_region_geoms)
+        except LayerDataException as e:
+            # No boundary for the unit - its rows are left as they are
+            skipped.append(f"{admin_level} {admin_level_id}: {e}")
+            continue
+        if region_mask.is_empty:
+            continue
+        (row_slice, col_slice) = region_mask.window.toslices()
+        unit_band = band[row_slice, col_slice]
+        unit_valid = valid[row_slice, col_slice] & region_mask.inside
+        unit_row_areas = row_areas[row_slice]
+        # c_*: commodity extent (area/heads) when the commodity has an extent raster, plain area (ha) otherwise
+        classes = summarize_classes(
+            unit_band, unit_valid, unit_row_areas,
+            weights[row_slice, col_slice] if weights is not None else None,
+        )
+        row = {**job["dimensions"], **location}
+        row.update(get_class_values(job["table"], classes, "c", "weighted_value" if weights is not None else "area_ha"))
+        if population is not None:
+            population_classes = summarize_classes(unit_band, unit_valid, unit_row_areas, population[row_slice, col_slice])
+            row.update(get_class_values(job["table"], population_classes, "pop", "weighted_value"))
+        rows.append(row)
+    return {
+        "table": job["table"],
+        "source_file": job["source_file"],
+        "rows": rows,
+        "skipped": skipped,
+        "seconds": round(time.perf_counter() - started, 2),
+    }
+
+
+class TableWriter:
+    # Batched upserts - tables have no unique key on the dimension columns, so existing ids are looked up first
+    def __init__(self, **kwargs):
+        self.db = kwargs.get("db")
+        self.table = kwargs.get("table")
+        self.Tbl = TABLES[self.table]
+        self.batch_size = kwargs.get("batch_size")
+        self.dry_run = kwargs.get("dry_run")
+        self.write_population = kwargs.get("write_population")
+        self.key_fields = DIMENSION_FIELDS + LOCATION_FIELDS + LAYER_FIELDS[self.table]
+        self.existing = {}
+        key_columns = [getattr(self.Tbl, field) for field in self.key_fields]
+        for (row_id, *key) in self.db.query(self.Tbl.id, *key_columns).order_by(self.Tbl.id):
+            self.existing.setdefault(tuple(key), row_id)
+        self.pending_inserts = []
+        self.pending_updates = []
+        self.inserted = 0
+        self.updated = 0
+
+
+    def add(self, rows):
+        for row in rows:
+            row_id = self.existing.get(tuple(row.get(field) for field in self.key_fields))
+            if row_id:
+                self.pending_updates.append({"id": row_id, **{
+                    field: value for (field, value) in row.items() if field not in self.key_fields
+                }})
+            else:
+                if not self.write_population:
+                    # The legend scales pop_* values - new rows need numbers, not NULLs
+                    row.update({f"pop_{field}": 0.0 for field in CLASS_FIELDS[self.table] if field})
+                self.pending_inserts.append(row)
+        if len(self.pending_inserts) >= self.batch_size or len(self.pending_updates) >= self.batch_size:
+            self.flush()
+
+
+    def flush(self):
+        for start in range(0, len(self.pending_inserts), self.batch_size):
+            chunk = self.pending_inserts[start:start + self.batch_size]
+            if not self.dry_run:
+                self.db.execute(insert(self.Tbl), chunk) # executemany
+            self.inserted += len(chunk)
+        for start in range(0, len(self.pending_updates), self.batch_size):
+            chunk = self.pending_updates[start:start + self.batch_size]
+            if not self.dry_run:
+                self.db.execute(update(self.Tbl), chunk) # executemany, by primary key
+            self.updated += len(chunk)
+        if not self.dry_run:
+            self.db.commit()
+        self.pending_inserts = []
+        self.pending_updates = []
+
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Regenerate layer class aggregates from the rasters")
+    parser.add_argument("--layer-types", nargs="*", default=["risk", "impact", "adaptation"], choices=["risk", "impact", "adaptation"])
+    parser.add_argument("--population-file", help="Population raster under DATA_ROOT_DIR for the pop_* fields (left as is when omitted)")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="Parallel raster processes")
+    parser.add_argument("--batch-size", type=int, default=1000, help="Rows per executemany chunk")
+    parser.add_argument("--dry-run", action="store_true", help="Compute everything, write nothing")
+    args = parser.parse_args()
+
+    data_root_dir = Path(env.get("DATA_ROOT_DIR"))
+    if args.population_file and not (data_root_dir / args.population_file).exists():
+        raise SystemExit(f"Population raster not found: {args.population_file}")
+    db = SessionLocal()
+    try:
+        units = list_admin_units(db)
+        jobs = list_raster_jobs(db, args.layer_types, data_root_dir)
+        print(f"Found {len(jobs)} raster(s) x {len(units)} admin unit(s), summarising with {args.workers} worker(s)")
+        writers = {
+            table: TableWriter(
+                db=db, table=table, batch_size=args.batch_size,
+                dry_run=args.dry_run, write_population=bool(args.population_file),
+            )
+            for table in sorted({job["table"] for job in jobs})
+        }
+        skipped_units = set()
+        started = time.perf_counter()
+        with ProcessPoolExecutor(
+            max_workers=args.workers,
+            initializer=init_worker,
+            initargs=(units, data_root_dir, args.population_file),
+        ) as executor:
+            futures = [executor.submit(process_raster, job) for job in jobs]
+            for future in as_completed(futures):
+                result = future.result()
+                writers[result["table"]].add(result["rows"])
+                print(f"[{result['table']}] {result['source_file']}: {len(result['rows'])} row(s) ({result['seconds']}s)")
+                skipped_units.update(result["skipped"])
+        for skipped_unit in sorted(skipped_units):
+            print(f"Skipped {skipped_unit}")
+        for (table, writer) in writers.items():
+            writer.flush()
+            print(f"{table}: {writer.inserted} inserted, {writer.updated} updated{' (dry run)' if args.dry_run else ''}")
+        print(f"Done in {time.perf_counter() - started:.1f}s")
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
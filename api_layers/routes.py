@@ -1,31 +1,72 @@
 from settings.database import get_db
 from sqlalchemy.orm import Session
 from fastapi import APIRouter, Request, Depends
-from fastapi.responses import StreamingResponse
-from .utils import GeoProc, TIFPicker, \
-    RiskData, ImpactData, AdaptationData, \
-    GlanceHazards, GlanceAdaptations
+from fastapi.responses import StreamingResponse, Response
+from . import utils # processors resolved at request time, see utils/__init__.py
 from api_layers.exceptions import LayerDataException
+from .utils.http_cache import http_cache
 from fastapi.concurrency import run_in_threadpool
+import os
 
 
 class LayerRouter:
     def __init__(self):
         self.router = APIRouter()
         self.router.add_api_route("/tif_picker", self.tif_picker, methods=["POST"])
-        self.router.add_api_route("/geojson", self.geojson, methods=["POST"])
-        self.router.add_api_route("/geojson/districts_c", self.geojson_districts_c, methods=["POST"])
-        self.router.add_api_route("/geotiff", self.geotiff, methods=["POST"])
-        self.router.add_api_route("/geotiff/raw", self.geotiff_raw, methods=["POST"])
+        self.router.add_api_route("/point", self.point, methods=["POST"])
+        self.router.add_api_route("/reverse_geocode", self.reverse_geocode, methods=["POST"])
+        self.router.add_api_route("/geojson", self.geojson, methods=["GET", "POST"])
+        self.router.add_api_route("/geojson/districts_c", self.geojson_districts_c, methods=["GET", "POST"])
+        self.router.add_api_route("/geotiff", self.geotiff, methods=["GET", "POST"])
+        self.router.add_api_route("/geotiff/stack", self.geotiff_stack, methods=["POST"])
+        self.router.add_api_route("/geotiff/diff", self.geotiff_diff, methods=["POST"])
+        self.router.add_api_route("/geotiff/raw", self.geotiff_raw, methods=["GET", "POST"])
+        self.router.add_api_route("/tiles/{z}/{x}/{y}", self.tiles, methods=["GET"])
+        self.router.add_api_route("/boundaries/{z}/{x}/{y}.mvt", self.boundaries, methods=["GET"])
+        self.router.add_api_route("/zonal_stats", self.zonal_stats, methods=["POST"])
         self.router.add_api_route("/legend", self.legend, methods=["POST"])
         self.router.add_api_route("/table", self.table, methods=["POST"])
         self.router.add_api_route("/hazards_glance", self.hazards_glance, methods=["POST"])
         self.router.add_api_route("/adaptations_glance", self.adaptations_glance, methods=["POST"])
         
 
+    def stream_file(self, rendered_file, chunk_size=1024 * 1024):
+        # Fixed-size chunks straight from the rendered file on disk; closes it once fully sent
+        with rendered_file:
+            while chunk := rendered_file.read(chunk_size):
+                yield chunk
+
+
+    def boundary_response(self, body, media_type, extra_headers, etag, encoding):
+        headers = {
+            **http_cache.get_headers(etag),
+            **extra_headers,
+            "Access-Control-Expose-Headers": ", ".join(["ETag", *extra_headers]),
+            "Vary": "Accept-Encoding",
+        }
+        if encoding:
+            headers["Content-Encoding"] = encoding
+        return Response(content=body, media_type=media_type, headers=headers)
+
+
+    async def get_request_params(self, request):
+        # POST: JSON body | GET (cacheable by browsers and proxies): query string, color_ramp as in /tiles
+        if request.method != "GET":
+            return await request.json()
+        request_params = dict(request.query_params)
+        if "color_ramp" in request_params:
+            request_params["color_ramp"] = [
+                f"#{color.strip().lstrip('#')}" for color in request_params["color_ramp"].split(",") if color.strip()
+            ]
+        for param in ["admin_level_id", "max_size"]:
+            if str(request_params.get(param) or "").isdigit():
+                request_params[param] = int(request_params[param])
+        return request_params
+    
+
     async def tif_picker(self, request: Request, db: Session=Depends(get_db)):
         request_body = await request.json()
-        data = TIFPicker(
+        data = utils.TIFPicker(
             db = db,
             layer_type = request_body.get("layer_type"),
             # common options - left pane
@@ -43,83 +84,265 @@ class LayerRouter:
     
 
 
-    async def geojson(self, request: Request, db: Session = Depends(get_db)):
+    async def point(self, request: Request, db: Session=Depends(get_db)):
         request_body = await request.json()
-        proc = GeoProc(
+        sampler = utils.PointSampler(
+            db = db,
+            lon = request_body.get("lon"),
+            lat = request_body.get("lat"),
+            # same selection as /tif_picker
+            layer_type = request_body.get("layer_type"),
+            analysis_scope_id = request_body.get("analysis_scope_id"),
+            visualization_scale_id = request_body.get("visualization_scale_id"),
+            commodity_id = request_body.get("commodity_id"),
+            data_source_id = request_body.get("data_source_id"),
+            risk_id = request_body.get("risk_id"),
+            impact_id = request_body.get("impact_id"),
+            adaptation_croptab_id = request_body.get("adaptation_croptab_id"),
+            adaptation_id = request_body.get("adaptation_id")
+        )
+        data = await run_in_threadpool(sampler.execute)
+        return {"success": 1, "data": data}
+
+
+    async def reverse_geocode(self, request: Request, db: Session=Depends(get_db)):
+        # {"lon": .., "lat": ..} -> one location | {"points": [[lon, lat], ...]} -> list of locations
+        request_body = await request.json()
+        data = await run_in_threadpool(utils.ReverseGeocoder(
+            db = db,
+            lon = request_body.get("lon"),
+            lat = request_body.get("lat"),
+            points = request_body.get("points"),
+        ).execute)
+        return {"success": 1, "data": data}
+
+
+    async def geojson(self, request: Request, db: Session = Depends(get_db)):
+        request_body = await self.get_request_params(request)
+        proc = utils.GeoProc(
             db=db,
             admin_level=request_body.get("admin_level"),
             admin_level_id=request_body.get("admin_level_id"),
+            resolution=request_body.get("resolution"), # full/high/medium/low
+            zoom=request_body.get("zoom"), # or the map zoom, mapped to a resolution
+            output_format=request_body.get("format"), # geojson/flatgeobuf/geoarrow
         )
-        data = proc.prep_geojson()
-        return {"success": 1, "data": data}
+        media_type = proc.get_media_type()
+        encoding = http_cache.get_encoding(request)
+        etag = http_cache.make_etag(
+            "geojson", proc.admin_level, proc.admin_level_id, proc.get_resolution(), proc.output_format, encoding,
+            proc.get_boundary_version(proc.get_resolution())
+        )
+        if http_cache.is_fresh(request, etag):
+            return http_cache.not_modified(etag)
+        # Pre-serialized (and pre-compressed) body from the boundary store, sent as is
+        (body, headers) = await run_in_threadpool(proc.prep_geojson, encoding)
+        return self.boundary_response(body, media_type, headers, etag, encoding)
     
 
     async def geojson_districts_c(self, request: Request, db: Session = Depends(get_db)):
-        request_body = await request.json()
-        proc = GeoProc(
+        request_body = await self.get_request_params(request)
+        proc = utils.GeoProc(
             db=db,
             admin_level=request_body.get("admin_level"),
             admin_level_id=request_body.get("admin_level_id"),
+            resolution=request_body.get("resolution"), # full/high/medium/low
+            zoom=request_body.get("zoom"), # or the map zoom, mapped to a resolution
+            output_format=request_body.get("format"), # geojson/flatgeobuf/geoarrow
         )
-        data = proc.prep_geojson_districts_c()
-        return {"success": 1, "data": data}
+        media_type = proc.get_media_type()
+        encoding = http_cache.get_encoding(request)
+        etag = http_cache.make_etag(
+            "geojson_districts_c", proc.admin_level, proc.admin_level_id, proc.get_resolution("simplified"), proc.output_format, encoding,
+            proc.get_boundary_version(proc.get_resolution("simplified"))
+        )
+        if http_cache.is_fresh(request, etag):
+            return http_cache.not_modified(etag)
+        # Pre-serialized (and pre-compressed) body from the boundary store, sent as is
+        (body, headers) = await run_in_threadpool(proc.prep_geojson_districts_c, encoding)
+        return self.boundary_response(body, media_type, headers, etag, encoding)
 
 
     async def geotiff(self, request: Request, db: Session = Depends(get_db)):
-        request_body = await request.json()
-        proc = GeoProc(
+        request_body = await self.get_request_params(request)
+        proc = utils.GeoProc(
             db=db,
             admin_level=request_body.get("admin_level"),
             admin_level_id=request_body.get("admin_level_id"),
             source_file=request_body.get("source_file"),
             color_ramp=request_body.get("color_ramp"),
+            output_mode=request_body.get("output_mode"),
+            max_size=request_body.get("max_size"),
         )
-        # Offload CPU-heavy raster processing to threadpool - in-memory BytesIO
-        memfile = await run_in_threadpool(proc.prep_geotiff)
+        # Same inputs + unchanged source file -> same bytes; answered before any raster work
+        etag = http_cache.make_etag(proc.get_geotiff_cache_key())
+        if http_cache.is_fresh(request, etag):
+            return http_cache.not_modified(etag)
+        # Offload CPU-heavy raster processing to threadpool - open file handle of the rendered GeoTIFF
+        rendered_file = await run_in_threadpool(proc.prep_geotiff)
         selected_region = "_".join(proc.get_region())
         tif_file_name = str(request_body.get("source_file")).split("/")[-1]
         download_filename = f"{selected_region}_{tif_file_name}".replace(" ", "_")
         return StreamingResponse(
-            memfile,  # stream directly
+            self.stream_file(rendered_file),
             media_type="image/tiff",
             headers={
+                **http_cache.get_headers(etag),
+                "Content-Length": str(os.fstat(rendered_file.fileno()).st_size),
+                "Content-Disposition": f'inline; filename="{download_filename}.tif"',
+                "Access-Control-Expose-Headers": "Content-Disposition, ETag",
+                "X-Accel-Buffering": "no"
+            },
+        )
+
+    async def geotiff_stack(self, request: Request, db: Session = Depends(get_db)):
+        # {"source_files": [...raster_files[].source_file], "color_ramps": [...] | "color_ramp": [...], ...}
+        request_body = await request.json()
+        proc = utils.GeoProc(
+            db=db,
+            admin_level=request_body.get("admin_level"),
+            admin_level_id=request_body.get("admin_level_id"),
+            source_files=request_body.get("source_files"),
+            color_ramps=request_body.get("color_ramps"),
+            color_ramp=request_body.get("color_ramp"),
+            output_mode=request_body.get("output_mode"),
+            max_size=request_body.get("max_size"),
+        )
+        rendered_file = await run_in_threadpool(proc.prep_geotiff_stack)
+        selected_region = "_".join(proc.get_region())
+        download_filename = f"{selected_region}_Stack_{len(proc.source_files)}".replace(" ", "_")
+        return StreamingResponse(
+            self.stream_file(rendered_file),
+            media_type="image/tiff",
+            headers={
+                "Content-Length": str(os.fstat(rendered_file.fileno()).st_size),
                 "Content-Disposition": f'inline; filename="{download_filename}.tif"',
                 "Access-Control-Expose-Headers": "Content-Disposition",
                 "X-Accel-Buffering": "no"
             },
         )
 
-    async def geotiff_raw(self, request: Request, db: Session = Depends(get_db)):
+    async def geotiff_diff(self, request: Request, db: Session = Depends(get_db)):
+        # {"source_file": future, "base_file": baseline, "operation": "difference"|"ratio", "breaks": [4 values], ...}
         request_body = await request.json()
-        proc = GeoProc(
+        proc = utils.GeoProc(
+            db=db,
+            admin_level=request_body.get("admin_level"),
+            admin_level_id=request_body.get("admin_level_id"),
+            source_file=request_body.get("source_file"),
+            base_file=request_body.get("base_file"),
+            operation=request_body.get("operation"),
+            breaks=request_body.get("breaks"),
+            color_ramp=request_body.get("color_ramp"), # defaults to the delta ramp
+            output_mode=request_body.get("output_mode"),
+            max_size=request_body.get("max_size"),
+        )
+        rendered_file = await run_in_threadpool(proc.prep_geotiff_diff)
+        selected_region = "_".join(proc.get_region())
+        tif_file_name = str(request_body.get("source_file")).split("/")[-1].removesuffix(".tif")
+        base_file_name = str(request_body.get("base_file")).split("/")[-1].removesuffix(".tif")
+        download_filename = f"{selected_region}_{tif_file_name}_vs_{base_file_name}".replace(" ", "_")
+        return StreamingResponse(
+            self.stream_file(rendered_file),
+            media_type="image/tiff",
+            headers={
+                "Content-Length": str(os.fstat(rendered_file.fileno()).st_size),
+                "Content-Disposition": f'inline; filename="{download_filename}.tif"',
+                "Access-Control-Expose-Headers": "Content-Disposition",
+                "X-Accel-Buffering": "no"
+            },
+        )
+
+    async def geotiff_raw(self, request: Request, db: Session = Depends(get_db)):
+        request_body = await self.get_request_params(request)
+        proc = utils.GeoProc(
             db=db,
             admin_level=request_body.get("admin_level"),
             admin_level_id=request_body.get("admin_level_id"),
             source_file=request_body.get("source_file"),
+            raw_dtype=request_body.get("dtype"),
+            compress=request_body.get("compress"),
+            max_size=request_body.get("max_size"),
         )
-        memfile = await run_in_threadpool(proc.prep_raw_geotiff)
+        etag = http_cache.make_etag(proc.get_raw_geotiff_cache_key())
+        if http_cache.is_fresh(request, etag):
+            return http_cache.not_modified(etag)
+        rendered_file = await run_in_threadpool(proc.prep_raw_geotiff)
         selected_region = "_".join(proc.get_region())
         tif_file_name = str(request_body.get("source_file")).split("/")[-1]
         download_filename = f"{selected_region}_{tif_file_name}_Raw".replace(" ", "_")
         return StreamingResponse(
-            memfile,
+            self.stream_file(rendered_file),
             media_type="image/tiff",
             headers={
+                **http_cache.get_headers(etag),
+                "Content-Length": str(os.fstat(rendered_file.fileno()).st_size),
                 "Content-Disposition": f'inline; filename="{download_filename}.tif"',
-                "Access-Control-Expose-Headers": "Content-Disposition",
+                "Access-Control-Expose-Headers": "Content-Disposition, ETag",
                 "X-Accel-Buffering": "no"
             },
         )
 
+    async def tiles(self, z: int, x: int, y: int, request: Request, db: Session = Depends(get_db)):
+        # GET for map clients: ?source_file=...&color_ramp=FFFFCC,FFE680,...&admin_level=state&admin_level_id=90&tile_format=png
+        query_params = request.query_params
+        color_ramp = [
+            f"#{color.strip().lstrip('#')}" for color in query_params.get("color_ramp", "").split(",") if color.strip()
+        ]
+        admin_level_id = query_params.get("admin_level_id")
+        try:
+            admin_level_id = int(admin_level_id) if admin_level_id else None
+        except ValueError:
+            raise LayerDataException("Please choose a valid region")
+        proc = utils.TileProc(
+            db=db,
+            admin_level=query_params.get("admin_level") or "total",
+            admin_level_id=admin_level_id,
+            source_file=query_params.get("source_file"),
+            color_ramp=color_ramp,
+            z=z, x=x, y=y,
+            tile_format=query_params.get("tile_format"),
+        )
+        etag = http_cache.make_etag(proc.get_tile_cache_key())
+        if http_cache.is_fresh(request, etag):
+            return http_cache.not_modified(etag)
+        tile = await run_in_threadpool(proc.prep_tile)
+        return Response(content=tile, media_type=proc.get_media_type(), headers=http_cache.get_headers(etag))
+
+    async def boundaries(self, z: int, x: int, y: int, request: Request):
+        # GET for map clients: ?layers=countries,states (default: outline, countries, states, districts)
+        layers = request.query_params.get("layers")
+        proc = utils.BoundaryTileProc(
+            z=z, x=x, y=y,
+            layer_names=[layer.strip() for layer in layers.split(",") if layer.strip()] if layers else None,
+        )
+        etag = proc.get_etag()
+        if http_cache.is_fresh(request, etag):
+            return http_cache.not_modified(etag)
+        tile = await run_in_threadpool(proc.prep_tile)
+        return Response(content=tile, media_type=proc.media_type, headers=http_cache.get_headers(etag))
+
+    async def zonal_stats(self, request: Request, db: Session = Depends(get_db)):
+        request_body = await request.json()
+        proc = utils.ZonalStats(
+            db=db,
+            admin_level=request_body.get("admin_level"),
+            admin_level_id=request_body.get("admin_level_id"),
+            source_file=request_body.get("source_file"),
+            commodity_id=request_body.get("commodity_id"), # Optional - weight by the commodity extent raster
+        )
+        data = await run_in_threadpool(proc.execute)
+        return {"success": 1, "data": data}
+
     async def legend(self, request: Request, db: Session=Depends(get_db)):
         request_body = await request.json()
         layer_type = request_body.get("layer_type")
         if layer_type not in ["risk", "impact", "adaptation"]:
             raise LayerDataException("Please choose an appropriate layer")
         data_class_index = {
-            "risk": RiskData,
-            "impact": ImpactData,
-            "adaptation": AdaptationData,
+            "risk": utils.RiskData,
+            "impact": utils.ImpactData,
+            "adaptation": utils.AdaptationData,
         }
         LayerData = data_class_index[layer_type]
         data = LayerData(
@@ -146,9 +369,9 @@ class LayerRouter:
         if layer_type not in ["risk", "impact", "adaptation"]:
             raise LayerDataException("Please choose an appropriate layer")
         data_class_index = {
-            "risk": RiskData,
-            "impact": ImpactData,
-            "adaptation": AdaptationData,
+            "risk": utils.RiskData,
+            "impact": utils.ImpactData,
+            "adaptation": utils.AdaptationData,
         }
         LayerData = data_class_index[layer_type]
         layer_data = LayerData(
@@ -182,7 +405,7 @@ class LayerRouter:
 
     async def hazards_glance(self, request: Request, db: Session=Depends(get_db)):
         request_body = await request.json()
-        data = GlanceHazards(
+        data = utils.GlanceHazards(
             db=db,
             commodity_id=request_body.get("commodity_id"),
         ).execute()
@@ -191,7 +414,7 @@ class LayerRouter:
 
     async def adaptations_glance(self, request: Request, db: Session=Depends(get_db)):
         request_body = await request.json()
-        data = GlanceAdaptations(
+        data = utils.GlanceAdaptations(
             db=db,
             commodity_id=request_body.get("commodity_id"),
             adaptation_croptab_id=request_body.get("adaptation_croptab_id"),
@@ -1,7 +1,27 @@
-from .geo_proc import GeoProc
-from .tif_picker import TIFPicker
-from .risk_data import RiskData
-from .impact_data import ImpactData
-from .adaptation_data import AdaptationData
-from .glance_hazards import GlanceHazards # Hazards == Risks, only changes in labels
-from .glance_adaptations import GlanceAdaptations
+# Processors are imported on first use (PEP 562) - rasterio, geopandas, pandas, openpyxl, Pillow and
+# mapbox_vector_tile stay out of worker boot; `from api_layers.utils import GeoProc` works as before
+import importlib
+
+_exports = {
+    "GeoProc": ".geo_proc",
+    "TileProc": ".tile_proc",
+    "BoundaryTileProc": ".boundary_tiles",
+    "ZonalStats": ".zonal_stats",
+    "PointSampler": ".point_sampler",
+    "ReverseGeocoder": ".reverse_geocoder",
+    "TIFPicker": ".tif_picker",
+    "RiskData": ".risk_data",
+    "ImpactData": ".impact_data",
+    "AdaptationData": ".adaptation_data",
+    "GlanceHazards": ".glance_hazards", # Hazards == Risks, only changes in labels
+    "GlanceAdaptations": ".glance_adaptations",
+}
+__all__ = list(_exports)
+
+
+def __getattr__(name):
+    if name not in _exports:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(_exports[name], __name__), name)
+    globals()[name] = value
+    return value
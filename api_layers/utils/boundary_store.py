@@ -0,0 +1,266 @@
+import gzip
+import json
+import threading
+import time
+import brotli
+import geopandas as gpd
+import numpy as np
+import pandas as pd
+import shapely
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+from pathlib import Path
+from settings import ROOT_DIR, env
+from .http_cache import http_cache
+
+
+def write_flatgeobuf(gdf):
+    # FlatGeobuf with its packed R-tree spatial index - streamable, clients can decode features as they arrive
+    # (the index stores features in Hilbert order, not file order)
+    buffer = BytesIO()
+    gdf.to_file(buffer, driver="FlatGeobuf", layer="boundary", SPATIAL_INDEX="YES")
+    return buffer.getvalue()
+
+
+def write_geoarrow(gdf):
+    # Arrow IPC stream, native GeoArrow geometry columns (CRS in the field metadata)
+    import pyarrow as pa # only needed for this format - kept off worker boot
+    table = pa.table(gdf.to_arrow(geometry_encoding="geoarrow", index=False))
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue().to_pybytes()
+
+
+# output format: writer of the binary boundary payloads (GeoJSON is spliced into the JSON envelope instead)
+BINARY_WRITERS = {
+    "flatgeobuf": write_flatgeobuf,
+    "geoarrow": write_geoarrow,
+}
+
+
+class Boundary:
+    # One admin unit: its features, bbox, GeoJSON (serialized once) and the geometry list handed to rasterio mask
+    def __init__(self, gdf):
+        self.gdf = gdf
+        self.bbox = gdf.total_bounds.tolist()
+        self.geojson_bytes = gdf.to_json(separators=(",", ":")).encode("utf-8")
+        self.geoms = [feature["geometry"] for feature in json.loads(self.geojson_bytes)["features"]]
+        self.bodies = {} # {(payload key, content encoding): response body}
+
+
+    def encode(self, key, build, encoding):
+        # Built and compressed once per unit, payload and encoding, then served from memory
+        body = self.bodies.get((key, encoding))
+        if body is None:
+            body = build()
+            if encoding == "br":
+                body = brotli.compress(body, quality=9)
+            elif encoding == "gzip":
+                body = gzip.compress(body, compresslevel=6, mtime=0)
+            self.bodies[(key, encoding)] = body
+        return body
+
+
+    def get_body(self, fields, encoding=None):
+        # {"success": 1, "data": {**fields, "geojson": ...}} with the GeoJSON spliced in as bytes - no re-encoding
+        def build():
+            head = json.dumps({"success": 1, "data": {**fields, "geojson": None}}, separators=(",", ":"))[:-len("null}}")]
+            return head.encode("utf-8") + self.geojson_bytes + b"}}"
+        return self.encode(json.dumps(fields), build, encoding)
+
+
+    def get_binary(self, output_format, encoding=None):
+        return self.encode(output_format, lambda: BINARY_WRITERS[output_format](self.gdf), encoding)
+
+
+
+# Admin unit files per level - ids from the file names (country_5.geojson -> 5)
+UNIT_FILES = {
+    "total": "sa_outline.geojson",
+    "country": "sa_countries/country_*.geojson",
+    "state": "sa_states/state_*.geojson",
+    "districts_c": "sa_districts_c/full_resolution/districts_c*.geojson",
+}
+# resolution: coverage simplification tolerance in degrees, None = the source files
+RESOLUTIONS = {"full": None, "high": 0.001, "medium": 0.005, "low": 0.02}
+# Variants written by api_layers.commands.build_boundary_simplifications:
+# _assets/shapefiles_geojson_simplified/{resolution}/{unit file} - outside shapefiles_geojson, so building them
+# leaves the boundary version (region masks, render cache, tiles, ETags) unchanged
+
+
+def simplify_units(gdfs, tolerance):
+    # {key: GeoDataFrame} simplified as one polygon coverage - borders shared by units (and files) stay shared
+    geoms = np.concatenate([gdf.geometry.to_numpy() for gdf in gdfs.values()])
+    try:
+        simplified = shapely.coverage_simplify(geoms, tolerance)
+    except (AttributeError, shapely.errors.GEOSException, shapely.errors.UnsupportedGEOSVersionError):
+        # shapely < 2.1 / GEOS < 3.12, or not a clean coverage - per polygon, shared borders may drift apart
+        simplified = shapely.simplify(geoms, tolerance, preserve_topology=True)
+    simplified_gdfs, offset = {}, 0
+    for (key, gdf) in gdfs.items():
+        part = simplified[offset:offset + len(gdf)]
+        simplified_gdfs[key] = gdf.set_geometry(gpd.GeoSeries(part, index=gdf.index, crs=gdf.crs))
+        offset += len(gdf)
+    return simplified_gdfs
+
+
+
+class BoundaryIndex:
+    # STRtree over one layer's geometries + their property columns, for point lookups
+    def __init__(self, gdf, fields):
+        self.geoms = gdf.geometry.to_numpy()
+        shapely.prepare(self.geoms) # contains_xy on prepared polygons: indexed point-in-polygon
+        self.tree = shapely.STRtree(self.geoms)
+        self.columns = {field: gdf[field].to_numpy() for field in fields}
+
+
+    def locate(self, lons, lats):
+        # Row of the geometry containing each point (first one where they overlap), -1 outside every geometry
+        # Bbox candidates from the tree, then one vectorized containment test - a predicate query is ~30x slower
+        (point_index, geom_index) = self.tree.query(shapely.points(lons, lats))
+        inside = shapely.contains_xy(self.geoms[geom_index], lons[point_index], lats[point_index])
+        rows = np.full(len(lons), -1)
+        rows[point_index[inside][::-1]] = geom_index[inside][::-1]
+        return rows
+
+
+
+class BoundaryStore:
+    # Every file under _assets/shapefiles_geojson parsed once per process, indexed by admin level + id + resolution
+    # Loaded at app startup (see main.py), lazily on first use elsewhere (commands, worker processes)
+    def __init__(self, **kwargs):
+        self.geojson_data_dir = kwargs.get("geojson_data_dir") or ROOT_DIR / "_assets/shapefiles_geojson"
+        self.simplified_data_dir = kwargs.get("simplified_data_dir") or ROOT_DIR / "_assets/shapefiles_geojson_simplified"
+        self.load_workers = int(kwargs.get("load_workers") or env.get("BOUNDARY_STORE_LOAD_WORKERS") or 8)
+        self.lock = threading.Lock()
+        self.load_lock = threading.Lock()
+        self.units = {} # {(admin_level, id, resolution): Boundary} - total, country, state (its districts), districts_c
+        self.districts = {} # {(state_id, district name, resolution): Boundary}
+        self.layers = {} # {layer name: GeoDataFrame} - whole-region layers for the vector tiles
+        self.indexes = {} # {layer name: BoundaryIndex} - reverse geocoding
+        self.version = None # asset version of the loaded files - part of the region mask and render cache keys
+        self.variants_version = None # asset version of the loaded simplified variant files
+        self.loaded = False
+
+
+    def read_files(self, pattern, root):
+        # {path relative to root: GeoDataFrame}
+        paths = sorted(root.glob(pattern))
+        with ThreadPoolExecutor(max_workers=self.load_workers) as executor:
+            gdfs = list(executor.map(gpd.read_file, paths))
+        return {path.relative_to(root).as_posix(): gdf for (path, gdf) in zip(paths, gdfs)}
+
+
+    def read_units(self, root):
+        # {admin_level: {relative path: GeoDataFrame}}
+        return {admin_level: self.read_files(pattern, root) for (admin_level, pattern) in UNIT_FILES.items()}
+
+
+    def get_file_id(self, rel_path):
+        stem = Path(rel_path).stem
+        digits = stem[len(stem.rstrip("0123456789")):]
+        return int(digits) if digits else stem
+
+
+    def get_variant_dir(self, resolution):
+        return self.simplified_data_dir / resolution
+
+
+    def get_variant(self, resolution, sources):
+        # Built variant files when present, otherwise simplified here from the source units
+        variant_dir = self.get_variant_dir(resolution)
+        if variant_dir.is_dir():
+            return self.read_units(variant_dir)
+        return {
+            admin_level: simplify_units(gdfs, RESOLUTIONS[resolution]) if gdfs else {}
+            for (admin_level, gdfs) in sources.items()
+        }
+
+
+    def add_units(self, units, districts, sources, resolution):
+        for (admin_level, gdfs) in sources.items():
+            for (rel_path, gdf) in gdfs.items():
+                unit_id = None if admin_level == "total" else self.get_file_id(rel_path)
+                units[(admin_level, unit_id, resolution)] = Boundary(gdf)
+                if admin_level == "state":
+                    for (district, district_gdf) in gdf.groupby("district", sort=False):
+                        districts[(unit_id, district, resolution)] = Boundary(district_gdf)
+
+
+    def load(self):
+        started = time.perf_counter()
+        version = http_cache.get_asset_version(self.geojson_data_dir)
+        variants_version = http_cache.get_asset_version(self.simplified_data_dir)
+        sources = self.read_units(self.geojson_data_dir)
+        units, districts = {}, {}
+        self.add_units(units, districts, sources, "full")
+        # Pre-built district overview per country, served by /geojson/districts_c unless a resolution is asked for
+        legacy_districts_c = self.read_files("sa_districts_c/simplified/districts_c*.json", self.geojson_data_dir)
+        self.add_units(units, districts, {"districts_c": legacy_districts_c}, "simplified")
+        for (resolution, tolerance) in RESOLUTIONS.items():
+            if tolerance is not None:
+                self.add_units(units, districts, self.get_variant(resolution, sources), resolution)
+        layers = {
+            "outline": sources["total"][UNIT_FILES["total"]],
+            "countries": gpd.read_file(self.geojson_data_dir / "sa_countries.geojson"),
+            "states": gpd.read_file(self.geojson_data_dir / "sa_states.geojson"),
+            "districts": pd.concat(list(sources["state"].values()), ignore_index=True),
+        }
+        indexes = {
+            "districts": BoundaryIndex(layers["districts"], ["district", "state_id", "country_id"]),
+            "countries": BoundaryIndex(layers["countries"], ["country_id"]),
+        }
+        with self.lock:
+            self.units, self.districts, self.layers, self.indexes = units, districts, layers, indexes
+            self.version, self.variants_version = version, variants_version
+            self.loaded = True
+        return time.perf_counter() - started
+
+
+    def ensure_loaded(self):
+        if self.loaded:
+            return
+        with self.load_lock:
+            if self.loaded:
+                return
+            self.load()
+
+
+    def get(self, admin_level, admin_level_id=None, resolution="full"):
+        # None when the unit has no boundary file
+        self.ensure_loaded()
+        if admin_level == "total":
+            return self.units.get(("total", None, resolution))
+        try:
+            return self.units.get((admin_level, int(admin_level_id), resolution))
+        except (TypeError, ValueError):
+            return None
+
+
+    def get_district(self, state_id, district, resolution="full"):
+        self.ensure_loaded()
+        return self.districts.get((state_id, district, resolution))
+
+
+    def get_version(self, resolution="full"):
+        # Version of the loaded files - of the files on disk (what a load would read) until then
+        # Simplified resolutions also depend on the built variant files
+        version = self.version or http_cache.get_asset_version(self.geojson_data_dir)
+        if RESOLUTIONS.get(resolution):
+            version += ":" + (self.variants_version or http_cache.get_asset_version(self.simplified_data_dir))
+        return version
+
+
+    def get_layer(self, layer_name):
+        self.ensure_loaded()
+        return self.layers[layer_name]
+
+
+    def get_index(self, layer_name):
+        self.ensure_loaded()
+        return self.indexes[layer_name]
+
+
+
+boundary_store = BoundaryStore()
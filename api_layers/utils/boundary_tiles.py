@@ -0,0 +1,138 @@
+import os
+import threading
+import mapbox_vector_tile
+import shapely
+from pathlib import Path
+from settings import ROOT_DIR, env
+from api_layers.exceptions import LayerDataException
+from .http_cache import http_cache
+from .boundary_store import boundary_store
+from .tile_proc import WEB_MERCATOR, WEB_MERCATOR_ORIGIN
+
+
+# layer (see BoundaryStore.layers): lowest zoom the layer is drawn at
+BOUNDARY_LAYERS = {
+    "outline": 0,
+    "countries": 0,
+    "states": 3,
+    "districts": 5,
+}
+
+
+class BoundaryTileProc:
+    # Admin boundaries as Mapbox Vector Tiles - clipped to the tile, simplified to the tile's pixel size
+    # Boundary store layers are indexed once per process in web mercator STRtrees; finished tiles are cached on disk
+    layers = None
+    layers_lock = threading.Lock()
+
+    def __init__(self, **kwargs):
+        self.cache_dir = Path(env.get("BOUNDARY_TILE_CACHE_DIR") or ROOT_DIR / "_cache/boundary_tiles")
+        self.max_zoom = int(env.get("BOUNDARY_TILE_MAX_ZOOM") or 14)
+        self.z = kwargs.get("z")
+        self.x = kwargs.get("x")
+        self.y = kwargs.get("y")
+        self.layer_names = kwargs.get("layer_names") or list(BOUNDARY_LAYERS)
+        self.extent = 4096
+        self.buffer = 64 # tile units drawn past the edge, hides seams between neighbouring tiles
+        self.simplify_pixels = 0.5 # tolerance in 256px-tile pixels
+        self.media_type = "application/vnd.mapbox-vector-tile"
+
+
+    def check_tile(self):
+        try:
+            self.z, self.x, self.y = int(self.z), int(self.x), int(self.y)
+        except (TypeError, ValueError):
+            raise LayerDataException("Please choose a valid tile")
+        if not (0 <= self.z <= self.max_zoom and 0 <= self.x < 2 ** self.z and 0 <= self.y < 2 ** self.z):
+            raise LayerDataException("Please choose a valid tile")
+        unknown_layers = [layer_name for layer_name in self.layer_names if layer_name not in BOUNDARY_LAYERS]
+        if unknown_layers:
+            raise LayerDataException(f"Please choose valid boundary layers ({'/'.join(BOUNDARY_LAYERS)})")
+
+
+    def load_layers(self):
+        if BoundaryTileProc.layers is not None:
+            return BoundaryTileProc.layers
+        with BoundaryTileProc.layers_lock:
+            if BoundaryTileProc.layers is None:
+                layers = {}
+                for layer_name in BOUNDARY_LAYERS:
+                    gdf = boundary_store.get_layer(layer_name).to_crs(WEB_MERCATOR)
+                    geoms = gdf.geometry.to_numpy()
+                    layers[layer_name] = {
+                        "geoms": geoms,
+                        "tree": shapely.STRtree(geoms),
+                        "properties": gdf.drop(columns="geometry").to_dict("records"),
+                    }
+                BoundaryTileProc.layers = layers
+        return BoundaryTileProc.layers
+
+
+    def get_tile_bounds(self):
+        tile_span = 2 * WEB_MERCATOR_ORIGIN / 2 ** self.z
+        left = -WEB_MERCATOR_ORIGIN + self.x * tile_span
+        top = WEB_MERCATOR_ORIGIN - self.y * tile_span
+        return (left, top - tile_span, left + tile_span, top)
+
+
+    def get_version(self):
+        # Version of the boundaries the tiles are rendered from (loaded once per process), not of the files on disk now
+        return boundary_store.get_version()
+
+
+    def get_cache_path(self):
+        # Keyed by the boundary version - edited boundary files never serve stale tiles
+        layers_key = "-".join(self.layer_names)
+        return self.cache_dir / self.get_version()[:16] / layers_key / str(self.z) / str(self.x) / f"{self.y}.mvt"
+
+
+    def get_etag(self):
+        return http_cache.make_etag("boundaries", self.z, self.x, self.y, ",".join(self.layer_names), self.get_version())
+
+
+    def render(self):
+        layers = self.load_layers()
+        (left, bottom, right, top) = self.get_tile_bounds()
+        buffer = (right - left) * self.buffer / self.extent
+        clip_box = (left - buffer, bottom - buffer, right + buffer, top + buffer)
+        tolerance = (right - left) / 256 * self.simplify_pixels
+        tile_layers = []
+        for layer_name in self.layer_names:
+            if self.z < BOUNDARY_LAYERS[layer_name]:
+                continue
+            layer = layers[layer_name]
+            features = []
+            for index in layer["tree"].query(shapely.box(*clip_box)):
+                geom = shapely.clip_by_rect(layer["geoms"][index], *clip_box)
+                geom = shapely.simplify(geom, tolerance, preserve_topology=True)
+                if geom.is_empty:
+                    continue
+                features.append({"geometry": geom, "properties": layer["properties"][index]})
+            if features:
+                tile_layers.append({"name": layer_name, "features": features})
+        return mapbox_vector_tile.encode(
+            tile_layers,
+            default_options={"quantize_bounds": (left, bottom, right, top), "extents": self.extent},
+        )
+
+
+    def prep_tile(self, force=False):
+        self.check_tile()
+        cache_path = self.get_cache_path()
+        if not force and cache_path.exists():
+            return cache_path.read_bytes()
+        tile = self.render()
+        cache_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = cache_path.with_name(f".{cache_path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+        tmp_path.write_bytes(tile)
+        os.replace(tmp_path, cache_path)
+        return tile
+
+
+    def get_tile_range(self, z):
+        # Tiles at zoom z covering the South Asia outline - (x_min, x_max, y_min, y_max), inclusive
+        (left, bottom, right, top) = shapely.total_bounds(self.load_layers()["outline"]["geoms"])
+        tile_span = 2 * WEB_MERCATOR_ORIGIN / 2 ** z
+        to_x = lambda value: min(max(int((value + WEB_MERCATOR_ORIGIN) // tile_span), 0), 2 ** z - 1)
+        to_y = lambda value: min(max(int((WEB_MERCATOR_ORIGIN - value) // tile_span), 0), 2 ** z - 1)
+        return (to_x(left), to_x(right), to_y(top), to_y(bottom))
@@ -0,0 +1,83 @@
+import os
+import resource
+import threading
+import rasterio
+from collections import OrderedDict
+from contextlib import contextmanager
+from settings import env
+
+
+class DatasetPool:
+    # Per-worker pool of open rasterio datasets, so GDAL's header parse and block cache outlive a request
+    # A handle is used by one thread at a time; idle handles are kept LRU by path within a count/fd budget
+    def __init__(self, **kwargs):
+        soft_fd_limit = resource.getrlimit(resource.RLIMIT_NOFILE)[0]
+        fd_budget = int(kwargs.get("max_fds") or env.get("RASTER_POOL_MAX_FDS") or max(soft_fd_limit // 4, 1))
+        max_datasets = int(kwargs.get("max_datasets") or env.get("RASTER_POOL_SIZE") or 64)
+        self.max_idle = max(min(max_datasets, fd_budget), 0)
+        self.lock = threading.Lock()
+        self.idle = OrderedDict() # {(path, open options): [dataset]}, least recently used first
+        self.stamps = {} # {(path, open options): (mtime_ns, size)} of the file the pooled handles point at
+        self.idle_count = 0
+
+
+    def get_stamp(self, path):
+        stat = os.stat(path)
+        return (stat.st_mtime_ns, stat.st_size)
+
+
+    def checkout(self, pool_key, stamp):
+        stale = []
+        dataset = None
+        with self.lock:
+            if self.stamps.get(pool_key) != stamp:
+                # File replaced on disk (new data, COG rebuild) - drop every idle handle to the old one
+                stale = self.idle.pop(pool_key, [])
+                self.idle_count -= len(stale)
+                self.stamps[pool_key] = stamp
+            handles = self.idle.get(pool_key)
+            if handles:
+                dataset = handles.pop()
+                self.idle_count -= 1
+                if not handles:
+                    del self.idle[pool_key]
+        for stale_dataset in stale:
+            stale_dataset.close()
+        if dataset is None:
+            path, open_options = pool_key
+            dataset = rasterio.open(path, **dict(open_options))
+        return dataset
+
+
+    def release(self, pool_key, stamp, dataset):
+        evicted = []
+        with self.lock:
+            if self.stamps.get(pool_key) != stamp or self.max_idle == 0:
+                evicted.append(dataset)
+            else:
+                self.idle.setdefault(pool_key, []).append(dataset)
+                self.idle.move_to_end(pool_key)
+                self.idle_count += 1
+            while self.idle_count > self.max_idle:
+                (oldest_key, handles) = next(iter(self.idle.items()))
+                evicted.append(handles.pop(0))
+                self.idle_count -= 1
+                if not handles:
+                    del self.idle[oldest_key]
+        for evicted_dataset in evicted:
+            evicted_dataset.close()
+
+
+    @contextmanager
+    def open(self, path, **open_options):
+        pool_key = (str(path), tuple(sorted(open_options.items())))
+        stamp = self.get_stamp(path)
+        dataset = self.checkout(pool_key, stamp)
+        try:
+            yield dataset
+        finally:
+            self.release(pool_key, stamp, dataset)
+
+
+
+dataset_pool = DatasetPool()
@@ -1,16 +1,17 @@
-import geopandas as gpd
 import rasterio
-from rasterio.mask import mask
-from rasterio.io import MemoryFile
+from rasterio.transform import Affine
 from rasterio.enums import Resampling
 import numpy as np
-from matplotlib.colors import to_rgba
-from io import BytesIO
 import json
 from settings import ROOT_DIR, env
 from pathlib import Path
 from api_lookups.models import LkpCountry, LkpState, LkpDistrict
-from api_layers.exceptions import NoRasterDataException, RasterFileNotFoundException
+from api_layers.exceptions import NoRasterDataException, RasterFileNotFoundException, LayerDataException
+from .render_cache import render_cache
+from .boundary_store import RESOLUTIONS, boundary_store
+from .dataset_pool import dataset_pool
+from .region_masks import RasterGrid, region_mask_cache
+from .palettes import DELTA_COLOR_RAMP, classify_band, colorize_band, get_palette
 
 
 class GeoProc:
@@ -21,13 +22,46 @@ class GeoProc:
         self.admin_level = kwargs.get("admin_level")
         self.admin_level_id = kwargs.get("admin_level_id")
         self.raster_layer = kwargs.get("layer")
-        self.geojson_index = {
-            "total": "sa_outline.geojson",
-            "country": f"sa_countries/country_{self.admin_level_id}.geojson",
-            "state": f"sa_states/state_{self.admin_level_id}.geojson",
-        }
         self.source_file = self.tif_data_dir / kwargs.get("source_file") if kwargs.get("source_file") else None
         self.color_ramp = kwargs.get("color_ramp")
+        # /geotiff/stack - several rasters on one grid (e.g. all scenarios of a layer), one ramp each or a shared one
+        # (None when the request value is not a list of file paths - rejected in check_stack_inputs)
+        source_files = kwargs.get("source_files") or []
+        self.source_files = (
+            [self.tif_data_dir / source_file for source_file in source_files]
+            if isinstance(source_files, list) and all(isinstance(source_file, str) and source_file for source_file in source_files)
+            else None
+        )
+        self.color_ramps = kwargs.get("color_ramps") or [self.color_ramp] * len(self.source_files or [])
+        self.max_stack_size = 64
+        # /geotiff/diff - source_file compared against base_file, classified into the 5-class delta ramp
+        self.base_file = self.tif_data_dir / kwargs.get("base_file") if kwargs.get("base_file") else None
+        self.operation = kwargs.get("operation") or "difference"
+        self.default_breaks = {
+            "difference": [-1.5, -0.5, 0.5, 1.5],
+            "ratio": [0.8, 0.95, 1.05, 1.2],
+        }
+        self.breaks = kwargs.get("breaks")
+        # Longest side (pixels) of the returned raster - large regions are read decimated from the overviews
+        self.max_size = kwargs.get("max_size")
+        # /geojson detail - a RESOLUTIONS name, or the map zoom it is drawn at (resolution wins when both are given)
+        self.resolution = kwargs.get("resolution")
+        self.zoom = kwargs.get("zoom")
+        # /geojson payload - "geojson": JSON envelope | "flatgeobuf" / "geoarrow": binary, region + bbox sent as headers
+        self.output_format = kwargs.get("output_format") or "geojson"
+        self.output_media_types = {
+            "geojson": "application/json",
+            "flatgeobuf": "application/flatgeobuf",
+            "geoarrow": "application/vnd.apache.arrow.stream",
+        }
+        # "rgba": 4-band RGBA | "paletted": 1-band class index with embedded colormap (categorical layers)
+        self.output_mode = kwargs.get("output_mode") or "rgba"
+        self.valid_output_modes = ["rgba", "paletted"]
+        # /geotiff/raw options - "float64" (default) | "source": keep source dtype | "int16": scaled with scale/offset
+        self.raw_dtype = kwargs.get("raw_dtype") or "float64"
+        self.valid_raw_dtypes = ["float64", "source", "int16"]
+        self.compress = kwargs.get("compress") or "deflate"
+        self.valid_compressions = ["deflate", "zstd"]
         self.tcase = lambda s: ' '.join(word.capitalize() for word in s.split())
 
 
@@ -44,44 +78,150 @@ class GeoProc:
             return [self.tcase(dist_obj.district), self.tcase(dist_obj.state.state), dist_obj.country.country]
 
 
-    def prep_geojson(self):
-        if self.admin_level != "district":
-            geojson_file = self.geojson_data_dir / self.geojson_index[self.admin_level]
-            gdf = gpd.read_file(geojson_file)
+    def get_resolution(self, default="full"):
+        if self.resolution is not None:
+            if self.resolution not in RESOLUTIONS:
+                raise LayerDataException(f"Please choose an appropriate resolution ({'/'.join(RESOLUTIONS)})")
+            return self.resolution
+        if self.zoom is None:
+            return default
+        try:
+            zoom = float(self.zoom)
+        except (TypeError, ValueError):
+            raise LayerDataException("Please choose a valid zoom level")
+        # Coarsest variant whose tolerance stays under one 256px-tile pixel at this zoom
+        pixel_size = 360 / (256 * 2 ** min(max(zoom, 0), 24))
+        fitting = [(tolerance, resolution) for (resolution, tolerance) in RESOLUTIONS.items() if tolerance and tolerance <= pixel_size]
+        return max(fitting)[1] if fitting else "full"
+
+
+    def get_boundary(self, resolution="full"):
+        # Boundary store lookup - districts by their state file + name, as in sa_states/state_{id}.geojson
         if self.admin_level == "district":
-            dist_obj = self.db.query(LkpDistrict).get(self.admin_level_id)
-            state_geojson_file = self.geojson_data_dir / f"sa_states/state_{dist_obj.state_id}.geojson"
-            gdf = gpd.read_file(state_geojson_file)
-            gdf = gdf[gdf["district"] == dist_obj.district] # Reliable to go by district name?
-            if gdf.empty:
-                raise ValueError(f"No district found with ID {self.admin_level_id} in {state_geojson_file}")
-        return {
-            "region": self.get_region(),
-            "bbox": gdf.total_bounds.tolist(),
-            "geojson": json.loads(gdf.to_json())
-        }
+            dist_obj = self.db.query(LkpDistrict).filter(LkpDistrict.id == self.admin_level_id).first()
+            boundary = boundary_store.get_district(dist_obj.state_id, dist_obj.district, resolution) if dist_obj else None
+        else:
+            boundary = boundary_store.get(self.admin_level, self.admin_level_id, resolution)
+        if boundary is None:
+            raise LayerDataException("No boundary available for the selected region")
+        return boundary
+
+
+    def get_boundary_version(self, resolution="full"):
+        # Version of the boundaries loaded in the store - the bytes actually sent, not the files on disk now
+        return boundary_store.get_version(resolution)
+
+
+    def get_media_type(self):
+        if self.output_format not in self.output_media_types:
+            raise LayerDataException(f"Please choose an appropriate format ({'/'.join(self.output_media_types)})")
+        return self.output_media_types[self.output_format]
+
+
+    def prep_boundary(self, boundary, fields, encoding):
+        # (finished response body, extra headers), optionally gzip/br encoded
+        # geojson: {"success": 1, "data": {**fields, "geojson"}} | binary formats: fields as JSON in X-<Field> headers
+        self.get_media_type()
+        if self.output_format == "geojson":
+            return (boundary.get_body(fields, encoding), {})
+        headers = {f"X-{field.capitalize()}": json.dumps(value) for (field, value) in fields.items()}
+        return (boundary.get_binary(self.output_format, encoding), headers)
+
+
+    def prep_geojson(self, encoding=None):
+        boundary = self.get_boundary(self.get_resolution())
+        return self.prep_boundary(boundary, {"region": self.get_region(), "bbox": boundary.bbox}, encoding)
+    
+
+    def prep_geojson_districts_c(self, encoding=None):
+        # Default: the pre-built sa_districts_c/simplified file
+        boundary = boundary_store.get("districts_c", self.admin_level_id, self.get_resolution("simplified"))
+        if boundary is None:
+            raise LayerDataException("No boundary available for the selected region")
+        return self.prep_boundary(boundary, {"country": self.get_region()[0], "bbox": boundary.bbox}, encoding)
     
 
-    def prep_geojson_districts_c(self):
-        geojson_file = self.geojson_data_dir / f"sa_districts_c/simplified/districts_c{self.admin_level_id}.json"
-        gdf = gpd.read_file(geojson_file)
+    def check_source_file(self):
+        if not self.source_file or not Path(self.source_file).exists():
+            raise RasterFileNotFoundException("The requested raster data file is unavailable")
+
+
+    def get_cache_key(self, kind, **params):
+        self.check_source_file()
+        return render_cache.make_key(
+            kind, self.source_file,
+            admin_level=self.admin_level,
+            admin_level_id=str(self.admin_level_id),
+            boundary_version=self.get_boundary_version(), # region clip - new boundaries, new key
+            max_size=self.max_size,
+            **params
+        )
+
+
+    def check_max_size(self):
+        if self.max_size is None:
+            return
+        try:
+            self.max_size = int(self.max_size)
+        except (TypeError, ValueError):
+            raise LayerDataException("Please choose a valid maximum size")
+        if self.max_size < 16:
+            raise LayerDataException("Please choose a maximum size of at least 16 pixels")
+
+
+    def get_region_geoms(self):
+        return self.get_boundary().geoms
+
+
+    def get_region_mask(self, src):
+        region_mask = region_mask_cache.get(
+            RasterGrid.from_dataset(src), self.admin_level, self.admin_level_id, self.get_region_geoms
+        )
+        if region_mask.is_empty:
+            selected_region = ", ".join(self.get_region())
+            raise NoRasterDataException(f"No data available for the selected inputs in {selected_region}")
+        return region_mask
+
+
+    def get_read_plan(self, src, region_mask):
+        # Crop window, output shape, region mask and transform of the read - decimated when max_size caps it
+        window = region_mask.window
+        inside = region_mask.inside
+        (height, width) = inside.shape
+        if not self.max_size or max(height, width) <= self.max_size:
+            return {"window": window, "out_shape": None, "inside": inside, "transform": src.window_transform(window)}
+        factor = max(height, width) / self.max_size
+        out_shape = (max(1, round(height / factor)), max(1, round(width / factor)))
+        # Nearest pixel centres, like the raster read
+        rows = ((np.arange(out_shape[0]) + 0.5) * height / out_shape[0]).astype(int)
+        cols = ((np.arange(out_shape[1]) + 0.5) * width / out_shape[1]).astype(int)
         return {
-            "country": self.get_region()[0],
-            "bbox": gdf.total_bounds.tolist(),
-            "geojson": json.loads(gdf.to_json())
+            "window": window,
+            "out_shape": out_shape,
+            "inside": inside[np.ix_(rows, cols)],
+            "transform": src.window_transform(window) * Affine.scale(width / out_shape[1], height / out_shape[0]),
         }
-    
+
+
+    def read_masked_band(self, src, window, inside, out_shape=None):
+        if out_shape:
+            # Categorical data - nearest; GDAL serves it from the closest overview level
+            raster_band = src.read(1, window=window, out_shape=out_shape, resampling=Resampling.nearest)
+        else:
+            raster_band = src.read(1, window=window)
+        nodata_mask = np.isnan(raster_band) | (raster_band == 0)
+        if src.nodata is not None and not np.isnan(src.nodata):
+            nodata_mask |= raster_band == src.nodata
+        return np.ma.masked_where(~inside | nodata_mask, raster_band)
+
 
     def handle_geotiff(self):
-        vector_data = self.prep_geojson()
-        geojson = vector_data.get("geojson")
-        if not Path(self.source_file).exists():
-            raise RasterFileNotFoundException("The requested raster data file is unavailable")
-        with rasterio.open(self.source_file) as src:
-            geoms = [feature["geometry"] for feature in geojson["features"]]
-            out_image, out_transform = mask(src, geoms, crop=True)
-            raster_band = out_image[0]
-            raster_masked = np.ma.masked_where(np.isnan(raster_band) | (raster_band == 0), raster_band)
+        self.check_source_file()
+        with dataset_pool.open(self.source_file) as src:
+            # Read only the region's crop window; the region mask is shared by all rasters on this grid
+            read_plan = self.get_read_plan(src, self.get_region_mask(src))
+            out_transform = read_plan["transform"]
+            raster_masked = self.read_masked_band(src, read_plan["window"], read_plan["inside"], read_plan["out_shape"])
             if raster_masked.mask.all():
                 selected_region = ", ".join(self.get_region())
                 raise NoRasterDataException(f"No data available for the selected inputs in {selected_region}")
@@ -91,16 +231,100 @@ class GeoProc:
                 "raster_meta": src.meta.copy()
             }
 
+
+    def check_stack_inputs(self):
+        if self.source_files is None:
+            raise LayerDataException("Please choose the raster files as a list of file paths")
+        if not self.source_files or len(self.source_files) > self.max_stack_size:
+            raise LayerDataException(f"Please choose between 1 and {self.max_stack_size} raster files")
+        if len(self.color_ramps) != len(self.source_files) or not all(self.color_ramps):
+            raise LayerDataException("Please provide a color ramp for every raster file")
+        for source_file in self.source_files:
+            if not Path(source_file).exists():
+                raise RasterFileNotFoundException(f"The requested raster data file is unavailable: {source_file.name}")
+
+
+    def read_masked_stack(self, source_files):
+        masked_bands = []
+        grid = None
+        for source_file in source_files:
+            with dataset_pool.open(source_file) as src:
+                if grid is None:
+                    # One mask/window for all the files
+                    grid = RasterGrid.from_dataset(src)
+                    read_plan = self.get_read_plan(src, self.get_region_mask(src))
+                    out_transform = read_plan["transform"]
+                    raster_meta = src.meta.copy()
+                elif RasterGrid.from_dataset(src).get_signature() != grid.get_signature():
+                    raise LayerDataException("The selected raster files must share the same grid")
+                masked_bands.append(self.read_masked_band(src, read_plan["window"], read_plan["inside"], read_plan["out_shape"]))
+        if all(masked_band.mask.all() for masked_band in masked_bands):
+            selected_region = ", ".join(self.get_region())
+            raise NoRasterDataException(f"No data available for the selected inputs in {selected_region}")
+        return {
+            "masked_bands": masked_bands,
+            "transform": out_transform,
+            "raster_meta": raster_meta
+        }
+
+
+    def handle_geotiff_stack(self):
+        self.check_stack_inputs()
+        return self.read_masked_stack(self.source_files)
+
+
+    def quantize_int16(self, masked_band):
+        # Linear scale/offset into int16 (-32767..32767), -32768 reserved for nodata
+        # Integer-valued bands that already fit int16 are stored losslessly with scale 1, offset 0
+        values = masked_band.compressed()
+        vmin, vmax = float(values.min()), float(values.max())
+        if np.all(values == np.round(values)) and vmin >= -32767 and vmax <= 32767:
+            scale, offset = 1.0, 0.0
+        else:
+            scale = (vmax - vmin) / 65534 if vmax > vmin else 1.0
+            offset = (vmax + vmin) / 2
+        quantized = np.round((masked_band.astype("float64") - offset) / scale)
+        return np.clip(quantized, -32767, 32767).filled(-32768).astype("int16"), scale, offset
+
+
+    def get_raw_geotiff_cache_key(self):
+        # Validated inputs -> render cache key, also the base of the HTTP ETag (no raster read)
+        if self.raw_dtype not in self.valid_raw_dtypes:
+            raise LayerDataException("Please choose an appropriate data type (float64/source/int16)")
+        if self.compress not in self.valid_compressions:
+            raise LayerDataException("Please choose an appropriate compression (deflate/zstd)")
+        self.check_max_size()
+        return self.get_cache_key("geotiff_raw", raw_dtype=self.raw_dtype, compress=self.compress)
+
+
     def prep_raw_geotiff(self):
+        cache_key = self.get_raw_geotiff_cache_key()
+        cached_file = render_cache.get(cache_key)
+        if cached_file:
+            return cached_file
         result = self.handle_geotiff()
         masked_band = result["masked_band"]
         transform = result["transform"]
         meta = result["raster_meta"].copy()
+        source_dtype = np.dtype(meta["dtype"])
+        scale, offset = None, None
+        if self.raw_dtype == "int16":
+            band, scale, offset = self.quantize_int16(masked_band)
+            nodata = -32768
+        elif self.raw_dtype == "source" and np.issubdtype(source_dtype, np.integer):
+            band = masked_band.filled(0) # 0 is already treated as no data
+            nodata = 0
+        elif self.raw_dtype == "source":
+            band = masked_band.filled(np.nan)
+            nodata = np.nan
+        else:
+            band = masked_band.astype("float64").filled(np.nan)
+            nodata = None # legacy output: NaN without a nodata tag
 
         # Update metadata
         meta.update({
             "count": 1,
-            "dtype": "float64",
+            "dtype": band.dtype.name,
             "driver": "GTiff",
             "height": masked_band.shape[0],
             "width": masked_band.shape[1],
@@ -108,56 +332,215 @@ class GeoProc:
             "tiled": True,
             "blockxsize": 256,
             "blockysize": 256,
-            "compress": "deflate",
+            "compress": self.compress,
         })
-        meta.pop("nodata", None) 
+        meta.pop("nodata", None)
+        if self.raw_dtype != "float64":
+            # floating-point / horizontal differencing; the legacy float64 output keeps its original encoding
+            meta["predictor"] = 3 if np.issubdtype(band.dtype, np.floating) else 2
+        if nodata is not None:
+            meta["nodata"] = nodata
+
+        # Written straight into the render cache, streamed from disk - no in-memory copies
+        tmp_path = render_cache.get_tmp_path(cache_key)
+        try:
+            with rasterio.open(tmp_path, "w", **meta) as dst:
+                dst.write(band, 1)
+                if scale is not None:
+                    dst.scales = (scale,)
+                    dst.offsets = (offset,)
+                    dst.update_tags(1, scale_factor=scale, add_offset=offset)
+                dst.build_overviews([2, 4, 8, 16], Resampling.nearest)
+                dst.update_tags(ns="rio_overview", resampling="nearest")
+            return render_cache.put_file(cache_key, tmp_path)
+        finally:
+            tmp_path.unlink(missing_ok=True)
 
-        memfile = MemoryFile()
-        with memfile.open(**meta) as dst:
-            dst.write(masked_band.filled(np.nan), 1)
-            dst.build_overviews([2, 4, 8, 16], Resampling.nearest)
-            dst.update_tags(ns="rio_overview", resampling="nearest")
+    def get_geotiff_cache_key(self):
+        if self.output_mode not in self.valid_output_modes:
+            raise LayerDataException("Please choose an appropriate output mode (rgba/paletted)")
+        self.check_max_size()
+        return self.get_cache_key("geotiff", color_ramp=self.color_ramp, output_mode=self.output_mode)
 
-        return BytesIO(memfile.read())
 
     def prep_geotiff(self):
+        cache_key = self.get_geotiff_cache_key()
+        cached_file = render_cache.get(cache_key)
+        if cached_file:
+            return cached_file
         result = self.handle_geotiff()
-        masked_band = result["masked_band"]
-        transform = result["transform"]
-        meta = result["raster_meta"]
-        hex_colors = self.color_ramp 
-        # RGBA array
-        rgba = np.zeros((masked_band.shape[0], masked_band.shape[1], 4), dtype=np.uint8)
-        unique_vals = np.unique(masked_band.compressed()).astype(int)
-        for val in unique_vals:
-            idx = val - 1
-            if 0 <= idx < len(hex_colors):
-                color = to_rgba(hex_colors[idx], 1.0) 
-                rgba[masked_band == val] = (np.array(color) * 255).astype(np.uint8)
-        rgba[masked_band.mask] = [0, 0, 0, 0]
+        return self.write_geotiff(cache_key, result["masked_band"], result["transform"], result["raster_meta"], self.color_ramp)
+
+
+    def write_geotiff(self, cache_key, masked_band, transform, meta, color_ramp, tags=None):
         # Base metadata
         out_meta = meta.copy()
         out_meta.update({
-            "count": 4,
             "driver": "GTiff",
             "dtype": "uint8",
-            "height": rgba.shape[0],
-            "width": rgba.shape[1],
+            "height": masked_band.shape[0],
+            "width": masked_band.shape[1],
             "transform": transform,
             "tiled": True,                # COG requirement
             "blockxsize": 256,            # tile width
             "blockysize": 256,            # tile height
             "compress": "deflate",        # or "lzw"
-            "interleave": "pixel"         # bands interleaved
         })
         out_meta.pop("nodata", None)
-        # Write to an in-memory GeoTIFF
-        memfile = MemoryFile()
-        with memfile.open(**out_meta) as dst:
-            for i in range(4):
-                dst.write(rgba[:, :, i], i + 1)
-            # Build overviews (pyramids for faster reads at smaller scales)
-            dst.build_overviews([2, 4, 8, 16], Resampling.nearest)
-            dst.update_tags(ns="rio_overview", resampling="nearest")
-        # Return BytesIO-like object for StreamingResponse
-        return BytesIO(memfile.read())
\ No newline at end of file
+        if self.output_mode == "paletted":
+            # Class values as-is, colors travel in the GDAL colormap; index 0 transparent
+            bands = classify_band(masked_band, len(color_ramp))[np.newaxis]
+            palette = get_palette(tuple(color_ramp))
+            colormap = {i: tuple(int(c) for c in palette[i]) for i in range(min(len(color_ramp), 255) + 1)}
+            out_meta.update({"count": 1, "nodata": 0, "photometric": "palette"})
+        else:
+            bands = colorize_band(masked_band, color_ramp).transpose(2, 0, 1)
+            out_meta.update({"count": 4, "interleave": "pixel"}) # bands interleaved
+        # Write the GeoTIFF straight into the render cache and return an open handle for streaming
+        tmp_path = render_cache.get_tmp_path(cache_key)
+        try:
+            with rasterio.open(tmp_path, "w", **out_meta) as dst:
+                dst.write(bands)
+                if self.output_mode == "paletted":
+                    dst.write_colormap(1, colormap)
+                if tags:
+                    dst.update_tags(**tags)
+                # Build overviews (pyramids for faster reads at smaller scales)
+                dst.build_overviews([2, 4, 8, 16], Resampling.nearest)
+                dst.update_tags(ns="rio_overview", resampling="nearest")
+            return render_cache.put_file(cache_key, tmp_path)
+        finally:
+            tmp_path.unlink(missing_ok=True)
+
+
+    def prep_geotiff_stack(self):
+        # Multi-band GeoTIFF of several rasters (bands in request order) for scenario sliders - one round trip
+        if self.output_mode not in self.valid_output_modes:
+            raise LayerDataException("Please choose an appropriate output mode (rgba/paletted)")
+        self.check_stack_inputs()
+        self.check_max_size()
+        cache_key = render_cache.make_key(
+            "geotiff_stack", *self.source_files,
+            admin_level=self.admin_level,
+            admin_level_id=str(self.admin_level_id),
+            boundary_version=self.get_boundary_version(),
+            max_size=self.max_size,
+            color_ramps=self.color_ramps,
+            output_mode=self.output_mode,
+        )
+        cached_file = render_cache.get(cache_key)
+        if cached_file:
+            return cached_file
+        result = self.handle_geotiff_stack()
+        masked_bands = result["masked_bands"]
+        out_meta = result["raster_meta"].copy()
+        out_meta.update({
+            "driver": "GTiff",
+            "dtype": "uint8",
+            "height": masked_bands[0].shape[0],
+            "width": masked_bands[0].shape[1],
+            "transform": result["transform"],
+            "tiled": True,
+            "blockxsize": 256,
+            "blockysize": 256,
+            "compress": "deflate",
+            "interleave": "band", # one scenario = contiguous bands
+        })
+        out_meta.pop("nodata", None)
+        source_names = [Path(source_file).relative_to(self.tif_data_dir).as_posix() for source_file in self.source_files]
+        if self.output_mode == "paletted":
+            # One class index band per raster (0 = no data); ramps travel in the band tags
+            bands = np.stack([
+                classify_band(masked_band, len(color_ramp))
+                for (masked_band, color_ramp) in zip(masked_bands, self.color_ramps)
+            ])
+            band_names = source_names
+            out_meta.update({"count": len(bands), "nodata": 0})
+        else:
+            # R, G, B, A per raster
+            bands = np.concatenate([
+                colorize_band(masked_band, color_ramp).transpose(2, 0, 1)
+                for (masked_band, color_ramp) in zip(masked_bands, self.color_ramps)
+            ])
+            band_names = [f"{source_name}:{channel}" for source_name in source_names for channel in "RGBA"]
+            out_meta.update({"count": len(bands)})
+        tmp_path = render_cache.get_tmp_path(cache_key)
+        try:
+            with rasterio.open(tmp_path, "w", **out_meta) as dst:
+                dst.write(bands)
+                dst.descriptions = tuple(band_names)
+                dst.update_tags(source_files=json.dumps(source_names), output_mode=self.output_mode)
+                if self.output_mode == "paletted":
+                    for (band_index, color_ramp) in enumerate(self.color_ramps, start=1):
+                        dst.update_tags(band_index, ramp=json.dumps(color_ramp))
+                dst.build_overviews([2, 4, 8, 16], Resampling.nearest)
+                dst.update_tags(ns="rio_overview", resampling="nearest")
+            return render_cache.put_file(cache_key, tmp_path)
+        finally:
+            tmp_path.unlink(missing_ok=True)
+
+
+    def check_diff_inputs(self):
+        if self.operation not in self.default_breaks:
+            raise LayerDataException("Please choose an appropriate operation (difference/ratio)")
+        self.breaks = self.breaks or self.default_breaks[self.operation]
+        try:
+            self.breaks = [float(value) for value in self.breaks]
+        except (TypeError, ValueError):
+            raise LayerDataException("Please provide 4 numeric class breaks")
+        if len(self.breaks) != 4 or self.breaks != sorted(self.breaks):
+            raise LayerDataException("Please provide 4 class breaks in increasing order")
+        self.color_ramp = self.color_ramp or DELTA_COLOR_RAMP
+        if len(self.color_ramp) != 5:
+            raise LayerDataException("Please provide a 5 color ramp for the change classes")
+        self.check_source_file()
+        if not self.base_file or not Path(self.base_file).exists():
+            raise RasterFileNotFoundException("The requested base raster data file is unavailable")
+
+
+    def classify_diff(self, source_band, base_band):
+        # NaN-aware source - base (or source / base), binned by the 4 breaks into change classes 1..5
+        source = source_band.astype("float64").filled(np.nan)
+        base = base_band.astype("float64").filled(np.nan)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            if self.operation == "ratio":
+                values = np.where(base != 0, source / base, np.nan)
+            else:
+                values = source - base
+        invalid = ~np.isfinite(values)
+        classes = np.digitize(np.where(invalid, 0, values), self.breaks) + 1
+        return np.ma.masked_array(classes.astype(np.uint8), mask=invalid)
+
+
+    def prep_geotiff_diff(self):
+        if self.output_mode not in self.valid_output_modes:
+            raise LayerDataException("Please choose an appropriate output mode (rgba/paletted)")
+        self.check_diff_inputs()
+        self.check_max_size()
+        # Cached by input pair (both files' mtime/size) + region + classification
+        cache_key = render_cache.make_key(
+            "geotiff_diff", self.source_file, self.base_file,
+            admin_level=self.admin_level,
+            admin_level_id=str(self.admin_level_id),
+            boundary_version=self.get_boundary_version(),
+            max_size=self.max_size,
+            operation=self.operation,
+            breaks=self.breaks,
+            color_ramp=self.color_ramp,
+            output_mode=self.output_mode,
+        )
+        cached_file = render_cache.get(cache_key)
+        if cached_file:
+            return cached_file
+        result = self.read_masked_stack([self.source_file, self.base_file])
+        class_band = self.classify_diff(*result["masked_bands"])
+        if class_band.mask.all():
+            selected_region = ", ".join(self.get_region())
+            raise NoRasterDataException(f"No data available for the selected inputs in {selected_region}")
+        tags = {
+            "source_file": Path(self.source_file).relative_to(self.tif_data_dir).as_posix(),
+            "base_file": Path(self.base_file).relative_to(self.tif_data_dir).as_posix(),
+            "operation": self.operation,
+            "breaks": json.dumps(self.breaks),
+        }
+        return self.write_geotiff(cache_key, class_band, result["transform"], result["raster_meta"], self.color_ramp, tags)
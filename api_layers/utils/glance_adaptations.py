@@ -8,6 +8,7 @@ from api_lookups.models import (
     LkpAdapt, LkpAdaptCropColor, LkpAdaptLivestockColor, LkpAdaptGroup
 )
 from api_layers.exceptions import LayerDataException
+from .raster_manifest import raster_manifest
 
 class GlanceAdaptations:
     def __init__(self, **kwargs):
@@ -55,7 +56,7 @@ class GlanceAdaptations:
                         "change_metric": change_metric_obj.metric,
                         "visualization_scale": scale,
                         "source_file": (Path(parent_folder)/ baseline_intm_folder / baseline_file).as_posix(),
-                        "exists": Path.exists(self.data_root_dir / parent_folder / baseline_intm_folder / baseline_file),
+                        "exists": raster_manifest.exists(self.data_root_dir / parent_folder / baseline_intm_folder / baseline_file),
                         "ramp": baseline_ramp,
                     })
         # Future scenarios
@@ -84,7 +85,7 @@ class GlanceAdaptations:
                 "change_metric": change_metric_obj.metric,
                 "visualization_scale": scale,
                 "source_file": (Path(parent_folder)/ intm_folder / scenario_file).as_posix(),
-                "exists": Path.exists(self.data_root_dir / parent_folder / intm_folder / scenario_file),
+                "exists": raster_manifest.exists(self.data_root_dir / parent_folder / intm_folder / scenario_file),
                 "ramp": scn_ramp
             })
         nonbaseline_scenario_ids = [row.id for row in self.db.query(LkpClimateScenario.id).filter(LkpClimateScenario.scenario != "Baseline").all()]
@@ -152,7 +153,7 @@ class GlanceAdaptations:
                                         "change_metric": change_metric_obj.metric,
                                         "visualization_scale": scale,
                                         "source_file": (Path(parent_folder)/ baseline_intm_folder / baseline_file).as_posix(),
-                                        "exists": Path.exists(self.data_root_dir / parent_folder / baseline_intm_folder / baseline_file),
+                                        "exists": raster_manifest.exists(self.data_root_dir / parent_folder / baseline_intm_folder / baseline_file),
                                         "ramp": cpfx_obj.ramp,
                                     })
                             else:
@@ -175,7 +176,7 @@ class GlanceAdaptations:
                                         "change_metric": change_metric_obj.metric,
                                         "visualization_scale": scale,
                                         "source_file": (Path(parent_folder)/ scenario_intm_folder / scenario_file).as_posix(),
-                                        "exists": Path.exists(self.data_root_dir / parent_folder / scenario_intm_folder / scenario_file),
+                                        "exists": raster_manifest.exists(self.data_root_dir / parent_folder / scenario_intm_folder / scenario_file),
                                         "ramp": cpfx_obj.ramp,
                                     })
             
@@ -224,7 +225,7 @@ class GlanceAdaptations:
                         "change_metric": change_metric_obj.metric,
                         "visualization_scale": scale,
                         "source_file": (Path(parent_folder)/ baseline_intm_folder / baseline_file).as_posix(),
-                        "exists": Path.exists(self.data_root_dir / parent_folder / baseline_intm_folder / baseline_file),
+                        "exists": raster_manifest.exists(self.data_root_dir / parent_folder / baseline_intm_folder / baseline_file),
                         "ramp": ramp,
                     })
         # Future scenarios
@@ -251,7 +252,7 @@ class GlanceAdaptations:
                 "change_metric": change_metric_obj.metric,
                 "visualization_scale": scale,
                 "source_file": (Path(parent_folder)/ intm_folder / scenario_file).as_posix(),
-                "exists": Path.exists(self.data_root_dir / parent_folder / intm_folder / scenario_file),
+                "exists": raster_manifest.exists(self.data_root_dir / parent_folder / intm_folder / scenario_file),
                 "ramp": ramp
             })
         nonbaseline_scenario_ids = [row.id for row in self.db.query(LkpClimateScenario.id).filter(LkpClimateScenario.scenario != "Baseline").all()]
@@ -319,7 +320,7 @@ class GlanceAdaptations:
                                         "intensity_metric": intensity_metric_obj.metric,
                                         "change_metric": change_metric_obj.metric,
                                         "source_file": (Path(parent_folder)/ baseline_intm_folder / baseline_file).as_posix(),
-                                        "exists": Path.exists(self.data_root_dir / parent_folder / baseline_intm_folder / baseline_file),
+                                        "exists": raster_manifest.exists(self.data_root_dir / parent_folder / baseline_intm_folder / baseline_file),
                                         "ramp": lsufx_obj.ramp,
                                     })
                             else:
@@ -342,7 +343,7 @@ class GlanceAdaptations:
                                         "change_metric": change_metric_obj.metric,
                                         "visualization_scale": scale,
                                         "source_file": (Path(parent_folder)/ scenario_intm_folder / scenario_file).as_posix(),
-                                        "exists": Path.exists(self.data_root_dir / parent_folder / scenario_intm_folder / scenario_file),
+                                        "exists": raster_manifest.exists(self.data_root_dir / parent_folder / scenario_intm_folder / scenario_file),
                                         "ramp": lsufx_obj.ramp,
                                     })
             raster_file_index.append(adap_index)
@@ -4,6 +4,7 @@ from settings import env
 from api_lookups.models import LkpCommodity, LkpVisualizationScale, \
     LkpClimateScenario, LkpIntensityMetric, LkpChangeMetric, \
     LkpRisk, LkpRiskColor
+from .raster_manifest import raster_manifest
 
 
 
@@ -72,7 +73,7 @@ class GlanceHazards:
                                         "change_metric": change_metric_obj.metric,
                                         "visualization_scale": scale,
                                         "source_file": (Path(parent_folder)/ baseline_intm_folder / baseline_file).as_posix(),
-                                        "exists": Path.exists(self.data_root_dir / parent_folder / baseline_intm_folder / baseline_file),
+                                        "exists": raster_manifest.exists(self.data_root_dir / parent_folder / baseline_intm_folder / baseline_file),
                                         "ramp": ramp,
                                     })
                             else:
@@ -96,7 +97,7 @@ class GlanceHazards:
                                         "change_metric": change_metric_obj.metric,
                                         "visualization_scale": scale,
                                         "source_file": (Path(parent_folder)/ scenario_intm_folder / scenario_file).as_posix(),
-                                        "exists": Path.exists(self.data_root_dir / parent_folder / scenario_intm_folder / scenario_file),
+                                        "exists": raster_manifest.exists(self.data_root_dir / parent_folder / scenario_intm_folder / scenario_file),
                                         "ramp": ramp if change_metric_id == 1 else delta_color_ramp,
                                     })
             raster_file_index.append(hazard_index)      
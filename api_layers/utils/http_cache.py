@@ -0,0 +1,80 @@
+import hashlib
+import os
+import threading
+import time
+from fastapi.responses import Response
+from settings import env
+
+
+class HttpCache:
+    # Strong ETags + conditional requests for deterministic responses
+    # ETag = request inputs + data version (source file mtime/size, or a hash of the asset tree)
+    def __init__(self, **kwargs):
+        self.max_age = int(kwargs.get("max_age") or env.get("HTTP_CACHE_MAX_AGE") or 3600)
+        self.version = str(kwargs.get("version") or env.get("HTTP_CACHE_VERSION") or "1") # bump to invalidate every client
+        self.asset_rescan_seconds = int(kwargs.get("asset_rescan_seconds") or env.get("HTTP_CACHE_ASSET_RESCAN_SECONDS") or 300)
+        self.lock = threading.Lock()
+        self.asset_versions = {} # {folder: (version hash, computed at)}
+
+
+    def get_asset_version(self, folder):
+        # Hash of every file's path/size/mtime under a folder - rehashed at most every asset_rescan_seconds
+        with self.lock:
+            cached = self.asset_versions.get(str(folder))
+            if cached and time.monotonic() - cached[1] < self.asset_rescan_seconds:
+                return cached[0]
+        digest = hashlib.sha256()
+        for (dir_path, dir_names, file_names) in sorted(os.walk(folder)):
+            dir_names.sort()
+            for file_name in sorted(file_names):
+                stat = os.stat(os.path.join(dir_path, file_name))
+                digest.update(f"{os.path.relpath(os.path.join(dir_path, file_name), folder)}:{stat.st_size}:{stat.st_mtime_ns}\n".encode("utf-8"))
+        version = digest.hexdigest()
+        with self.lock:
+            self.asset_versions[str(folder)] = (version, time.monotonic())
+        return version
+
+
+    def make_etag(self, *parts):
+        digest = hashlib.sha256("\n".join([self.version, *[str(part) for part in parts]]).encode("utf-8"))
+        return f'"{digest.hexdigest()[:40]}"'
+
+
+    def is_fresh(self, request, etag):
+        if_none_match = request.headers.get("if-none-match")
+        if not if_none_match:
+            return False
+        candidates = [candidate.strip().removeprefix("W/") for candidate in if_none_match.split(",")]
+        return "*" in candidates or etag in candidates
+
+
+    def get_encoding(self, request):
+        # Preferred precompressed encoding the client accepts: "br" | "gzip" | None (identity)
+        accepted = {}
+        for item in request.headers.get("accept-encoding", "").split(","):
+            (coding, _, params) = item.strip().lower().partition(";")
+            quality = params.strip().removeprefix("q=") if params.strip().startswith("q=") else "1"
+            try:
+                accepted[coding.strip()] = float(quality)
+            except ValueError:
+                continue
+        for encoding in ["br", "gzip"]:
+            if accepted.get(encoding, accepted.get("*", 0)) > 0:
+                return encoding
+        return None
+
+
+    def get_headers(self, etag):
+        return {
+            "ETag": etag,
+            "Cache-Control": f"public, max-age={self.max_age}",
+            "Access-Control-Expose-Headers": "ETag",
+        }
+
+
+    def not_modified(self, etag):
+        return Response(status_code=304, headers=self.get_headers(etag))
+
+
+
+http_cache = HttpCache()
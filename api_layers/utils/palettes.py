@@ -0,0 +1,45 @@
+from functools import lru_cache
+import numpy as np
+
+
+# 5-class change ramp (considerable decrease .. considerable increase), as in the risk legend
+DELTA_COLOR_RAMP = ["#4682B4", "#87CEFA", "#E7E6A8", "#FF6666", "#800000"]
+
+
+def hex_to_rgba(hex_color):
+    # "#RGB", "#RRGGBB" or "#RRGGBBAA" -> (r, g, b, a) uint8, opaque unless alpha given
+    hex_color = str(hex_color).strip().lstrip("#")
+    if len(hex_color) == 3:
+        hex_color = "".join(c * 2 for c in hex_color)
+    if len(hex_color) not in (6, 8):
+        raise ValueError(f"Invalid hex color: #{hex_color}")
+    rgba = [int(hex_color[i:i + 2], 16) for i in range(0, len(hex_color), 2)]
+    return tuple(rgba) if len(rgba) == 4 else (*rgba, 255)
+
+
+@lru_cache(maxsize=256)
+def get_palette(ramp):
+    # 256x4 uint8 lookup table: class value v (1-based) -> ramp[v - 1], index 0 transparent
+    palette = np.zeros((256, 4), dtype=np.uint8)
+    for (i, hex_color) in enumerate(ramp[:255]):
+        palette[i + 1] = hex_to_rgba(hex_color)
+    palette.setflags(write=False)
+    return palette
+
+
+def classify_band(masked_band, n_classes):
+    # Class index per pixel as uint8; 0 for masked, non-integer or out-of-ramp values
+    data = masked_band.data
+    n_classes = min(n_classes, 255)
+    valid = ~np.ma.getmaskarray(masked_band) & (data >= 1) & (data <= n_classes)
+    if not np.issubdtype(data.dtype, np.integer):
+        valid &= data == np.floor(data)
+    return np.where(valid, data, 0).astype(np.uint8)
+
+
+def colorize_band(masked_band, ramp):
+    # Single fancy-index pass through the ramp's palette -> (rows, cols, 4) RGBA
+    # Indexing a uint32 view moves each RGBA pixel as one word instead of four bytes
+    palette = get_palette(tuple(ramp)).view(np.uint32).ravel()
+    class_index = classify_band(masked_band, len(ramp))
+    return palette[class_index].view(np.uint8).reshape((*class_index.shape, 4))
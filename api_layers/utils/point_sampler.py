@@ -0,0 +1,84 @@
+import math
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from rasterio.errors import RasterioError, RasterioIOError
+from rasterio.warp import transform as warp_transform
+from rasterio.windows import Window
+from settings import env
+from api_layers.exceptions import LayerDataException, RasterFileNotFoundException
+from .tif_picker import TIFPicker
+from .dataset_pool import dataset_pool
+
+
+# Shared by all requests of a worker - single pixel reads are I/O bound
+sample_executor = ThreadPoolExecutor(max_workers=int(env.get("POINT_SAMPLE_WORKERS") or 8), thread_name_prefix="point-sample")
+
+
+class PointSampler:
+    # Value at one lon/lat in every raster of a TIFPicker selection (scenarios x years x metrics)
+    def __init__(self, **kwargs):
+        self.db = kwargs.get("db")
+        self.data_root_dir = Path(env.get("DATA_ROOT_DIR"))
+        self.lon = kwargs.get("lon")
+        self.lat = kwargs.get("lat")
+        self.picker_kwargs = {key: value for (key, value) in kwargs.items() if key not in ["db", "lon", "lat"]}
+
+
+    def check_location(self):
+        try:
+            self.lon, self.lat = float(self.lon), float(self.lat)
+        except (TypeError, ValueError):
+            raise LayerDataException("Please choose a valid location")
+        if not (math.isfinite(self.lon) and math.isfinite(self.lat) and -180 <= self.lon <= 180 and -90 <= self.lat <= 90):
+            raise LayerDataException("Please choose a valid location")
+
+
+    def sample(self, source_file):
+        # Single pixel windowed read; None outside the raster or on no data (nodata, NaN or 0, as in the map layers)
+        try:
+            with dataset_pool.open(self.data_root_dir / source_file) as src:
+                (x, y) = (self.lon, self.lat)
+                if src.crs and not src.crs.is_geographic:
+                    (xs, ys) = warp_transform("EPSG:4326", src.crs, [x], [y])
+                    (x, y) = (xs[0], ys[0])
+                (row, col) = src.index(x, y)
+                if not (0 <= row < src.height and 0 <= col < src.width):
+                    return None
+                value = src.read(1, window=Window(col, row, 1, 1))[0, 0]
+                nodata = src.nodata
+        except (FileNotFoundError, RasterioIOError):
+            # Listed in the raster manifest but removed or unreadable since
+            raise RasterFileNotFoundException("The requested raster data file is unavailable")
+        except RasterioError:
+            raise LayerDataException("The requested raster data file could not be read")
+        if np.isnan(value) or value == 0 or (nodata is not None and value == nodata):
+            return None
+        return value.item()
+
+
+    def execute(self):
+        self.check_location()
+        picked = TIFPicker(db=self.db, **self.picker_kwargs).execute()
+        raster_files = picked["raster_files"]
+        existing_files = [raster_file["source_file"] for raster_file in raster_files if raster_file["exists"]]
+        values = dict(zip(existing_files, sample_executor.map(self.sample, existing_files)))
+        return {
+            "lon": self.lon,
+            "lat": self.lat,
+            "level": picked.get("level"),
+            "commodity": picked.get("commodity"),
+            "mask": picked.get("mask"),
+            "series": [{
+                "climate_scenario_id": raster_file.get("climate_scenario_id"),
+                "climate_scenario": raster_file.get("climate_scenario"),
+                "year": raster_file.get("year"),
+                "intensity_metric_id": raster_file.get("intensity_metric_id"),
+                "intensity_metric": raster_file.get("intensity_metric"),
+                "change_metric_id": raster_file.get("change_metric_id"),
+                "change_metric": raster_file.get("change_metric"),
+                "source_file": raster_file["source_file"],
+                "exists": raster_file["exists"],
+                "value": values.get(raster_file["source_file"]),
+            } for raster_file in raster_files]
+        }
@@ -0,0 +1,157 @@
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from settings import env
+
+
+class RasterManifest:
+    # In-memory index of every file under DATA_ROOT_DIR, so the pickers check existence without a stat() per entry
+    # Built by a parallel directory walk on first use; a background thread polls directory mtimes and
+    # rescans only the directories whose entries changed (file added / removed / replaced)
+    def __init__(self, **kwargs):
+        self.data_root_dir = Path(kwargs.get("data_root_dir") or env.get("DATA_ROOT_DIR"))
+        self.refresh_seconds = float(kwargs.get("refresh_seconds") or env.get("RASTER_MANIFEST_REFRESH_SECONDS") or 30)
+        self.scan_workers = int(kwargs.get("scan_workers") or env.get("RASTER_MANIFEST_SCAN_WORKERS") or 16)
+        self.lock = threading.Lock()
+        self.load_lock = threading.Lock()
+        self.files = set() # relative paths
+        self.dirs = {} # {relative dir: (mtime_ns, {relative file paths}, [relative subdirs])}
+        self.loaded = False
+        self.watcher = None
+
+
+    def get_dir_mtime(self, rel_dir):
+        try:
+            return (self.data_root_dir / rel_dir).stat().st_mtime_ns
+        except FileNotFoundError:
+            return None
+
+
+    def scan_dir(self, rel_dir):
+        # Direct entries of one directory - None when it has disappeared
+        files, subdirs = set(), []
+        try:
+            dir_mtime = (self.data_root_dir / rel_dir).stat().st_mtime_ns
+            with os.scandir(self.data_root_dir / rel_dir) as entries:
+                for entry in entries:
+                    rel_path = f"{rel_dir}/{entry.name}" if rel_dir else entry.name
+                    if entry.is_dir():
+                        subdirs.append(rel_path)
+                    elif entry.is_file():
+                        files.add(rel_path)
+        except (FileNotFoundError, NotADirectoryError):
+            return None
+        return (dir_mtime, files, subdirs)
+
+
+    def walk(self, rel_dirs, executor):
+        # Level by level, every directory of a level scanned in parallel - {relative dir: scan_dir result}
+        scanned = {}
+        pending = list(rel_dirs)
+        while pending:
+            next_pending = []
+            for (rel_dir, result) in zip(pending, executor.map(self.scan_dir, pending)):
+                if result is None:
+                    continue
+                scanned[rel_dir] = result
+                next_pending += result[2]
+            pending = next_pending
+        return scanned
+
+
+    def apply(self, scanned):
+        for (rel_dir, (dir_mtime, files, subdirs)) in scanned.items():
+            previous = self.dirs.get(rel_dir)
+            if previous:
+                for rel_path in previous[1] - files:
+                    self.files.discard(rel_path)
+            self.files.update(files)
+            self.dirs[rel_dir] = (dir_mtime, files, subdirs)
+
+
+    def drop_tree(self, rel_dir):
+        previous = self.dirs.pop(rel_dir, None)
+        if previous:
+            self.files -= previous[1]
+            for subdir in previous[2]:
+                self.drop_tree(subdir)
+
+
+    def scan(self):
+        with ThreadPoolExecutor(max_workers=self.scan_workers) as executor:
+            scanned = self.walk([""], executor)
+        with self.lock:
+            self.files = set()
+            self.dirs = {}
+            self.apply(scanned)
+            self.loaded = True
+
+
+    def refresh(self):
+        with self.lock:
+            known = {rel_dir: entry[0] for (rel_dir, entry) in self.dirs.items()}
+        with ThreadPoolExecutor(max_workers=self.scan_workers) as executor:
+            mtimes = dict(zip(known, executor.map(self.get_dir_mtime, known)))
+            changed = [rel_dir for rel_dir in known if mtimes[rel_dir] != known[rel_dir]]
+            if not changed:
+                return
+            removed = [rel_dir for rel_dir in changed if mtimes[rel_dir] is None]
+            rescanned = {
+                rel_dir: result
+                for (rel_dir, result) in zip(changed, executor.map(self.scan_dir, changed))
+                if result is not None
+            }
+            with self.lock:
+                previous_subdirs = {rel_dir: set(self.dirs[rel_dir][2]) for rel_dir in rescanned if rel_dir in self.dirs}
+            new_subdirs, dropped_subdirs = [], []
+            for (rel_dir, (_, _, subdirs)) in rescanned.items():
+                new_subdirs += set(subdirs) - previous_subdirs.get(rel_dir, set())
+                dropped_subdirs += previous_subdirs.get(rel_dir, set()) - set(subdirs)
+            rescanned.update(self.walk(new_subdirs, executor))
+        with self.lock:
+            for rel_dir in removed + dropped_subdirs:
+                self.drop_tree(rel_dir)
+            self.apply(rescanned)
+
+
+    def watch(self):
+        while True:
+            time.sleep(self.refresh_seconds)
+            try:
+                self.refresh()
+            except OSError:
+                continue # storage hiccup - try again on the next poll
+
+
+    def ensure_loaded(self):
+        if self.loaded:
+            return
+        with self.load_lock:
+            if self.loaded:
+                return
+            self.scan()
+            self.watcher = threading.Thread(target=self.watch, name="raster-manifest", daemon=True)
+            self.watcher.start()
+
+
+    def get_relative_path(self, path):
+        # Paths built on DATA_ROOT_DIR, or already relative to it; None when outside it
+        path = Path(path)
+        try:
+            return path.relative_to(self.data_root_dir).as_posix()
+        except ValueError:
+            return path.as_posix() if not path.is_absolute() else None
+
+
+    def exists(self, path):
+        rel_path = self.get_relative_path(path)
+        if rel_path is None:
+            return Path(path).exists() # outside DATA_ROOT_DIR - not indexed
+        self.ensure_loaded()
+        return rel_path in self.files
+
+
+
+raster_manifest = RasterManifest()
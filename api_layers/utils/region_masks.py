@@ -0,0 +1,138 @@
+import hashlib
+import os
+import threading
+import numpy as np
+from pathlib import Path
+from rasterio.features import geometry_mask, geometry_window
+from rasterio.windows import Window, WindowError, transform as window_transform
+from settings import ROOT_DIR, env
+from .boundary_store import boundary_store
+
+
+class RasterGrid:
+    # Transform + shape + crs of a raster; rasters sharing a grid share region masks
+    def __init__(self, transform, width, height, crs):
+        self.transform = transform
+        self.width = width
+        self.height = height
+        self.crs = crs
+
+
+    @classmethod
+    def from_dataset(cls, src):
+        return cls(src.transform, src.width, src.height, src.crs.to_string() if src.crs else None)
+
+
+    def get_signature(self):
+        return (tuple(self.transform)[:6], self.width, self.height, self.crs)
+
+
+    def get_grid_id(self):
+        return hashlib.sha1(repr(self.get_signature()).encode("utf-8")).hexdigest()[:16]
+
+
+
+class RegionMask:
+    # Crop window of an admin region on a grid + bit-packed "inside region" mask for that window
+    def __init__(self, window=None, packed=None, shape=None):
+        self.window = window
+        self.packed = packed
+        self.shape = shape
+
+
+    @property
+    def is_empty(self):
+        return self.window is None
+
+
+    @property
+    def inside(self):
+        count = self.shape[0] * self.shape[1]
+        return np.unpackbits(self.packed, count=count).astype(bool).reshape(self.shape)
+
+
+    def get_transform(self, grid):
+        return window_transform(self.window, grid.transform)
+
+
+
+class RegionMaskCache:
+    # Masks are stored per version of the loaded boundaries - updated boundaries get new masks,
+    # old version dirs can be deleted
+    def __init__(self, **kwargs):
+        self.cache_dir = Path(kwargs.get("cache_dir") or env.get("REGION_MASK_CACHE_DIR") or ROOT_DIR / "_cache/region_masks")
+        self.masks = {} # {(boundary version, grid_id, admin_level, admin_level_id): RegionMask}
+        self.lock = threading.Lock()
+
+
+    def get_boundary_version(self):
+        return boundary_store.get_version()[:16]
+
+
+    def get_path(self, grid_id, admin_level, admin_level_id, boundary_version=None):
+        boundary_version = boundary_version or self.get_boundary_version()
+        return self.cache_dir / boundary_version / grid_id / f"{admin_level}_{admin_level_id}.npz"
+
+
+    def compute(self, grid, geoms):
+        try:
+            window = geometry_window(grid, geoms)
+        except WindowError:
+            return RegionMask()
+        if window.width == 0 or window.height == 0:
+            return RegionMask()
+        shape = (int(window.height), int(window.width))
+        inside = geometry_mask(geoms, out_shape=shape, transform=window_transform(window, grid.transform), invert=True)
+        return RegionMask(window=window, packed=np.packbits(inside, axis=None), shape=shape)
+
+
+    def load(self, path):
+        with np.load(path) as npz:
+            if bool(npz["empty"]):
+                return RegionMask()
+            col_off, row_off, width, height = npz["window"].tolist()
+            return RegionMask(
+                window=Window(col_off, row_off, width, height),
+                packed=npz["packed"],
+                shape=tuple(npz["shape"].tolist()),
+            )
+
+
+    def save(self, path, region_mask):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_name(f".{path.stem}.{os.getpid()}.{threading.get_ident()}.tmp.npz")
+        if region_mask.is_empty:
+            np.savez(tmp_path, empty=True)
+        else:
+            window = region_mask.window
+            np.savez(
+                tmp_path,
+                empty=False,
+                window=np.array([window.col_off, window.row_off, window.width, window.height]),
+                packed=region_mask.packed,
+                shape=np.array(region_mask.shape),
+            )
+        tmp_path.replace(path)
+
+
+    def get(self, grid, admin_level, admin_level_id, get_geoms):
+        # get_geoms is only called on a miss, so cached regions never touch the boundary files
+        grid_id = grid.get_grid_id()
+        boundary_version = self.get_boundary_version()
+        mask_key = (boundary_version, grid_id, admin_level, str(admin_level_id))
+        region_mask = self.masks.get(mask_key)
+        if region_mask is not None:
+            return region_mask
+        path = self.get_path(grid_id, admin_level, admin_level_id, boundary_version)
+        if path.exists():
+            region_mask = self.load(path)
+        else:
+            region_mask = self.compute(grid, get_geoms())
+            self.save(path, region_mask)
+        with self.lock:
+            self.masks[mask_key] = region_mask
+        return region_mask
+
+
+
+region_mask_cache = RegionMaskCache()
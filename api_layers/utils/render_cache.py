@@ -0,0 +1,118 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from settings import ROOT_DIR, env
+
+
+class RenderCache:
+    # Content-addressed on-disk cache of finished GeoTIFF payloads
+    # Key: render kind + request inputs + source file mtime/size, eviction: LRU within a byte budget
+    def __init__(self, **kwargs):
+        self.cache_dir = Path(kwargs.get("cache_dir") or env.get("RENDER_CACHE_DIR") or ROOT_DIR / "_cache/renders")
+        self.max_bytes = int(kwargs.get("max_bytes") or env.get("RENDER_CACHE_MAX_BYTES") or 2 * 1024 ** 3) # 2 GiB
+        self.rescan_seconds = int(kwargs.get("rescan_seconds") or env.get("RENDER_CACHE_RESCAN_SECONDS") or 300)
+        self.suffix = ".tif"
+        self.lock = threading.Lock()
+        self.index = None # OrderedDict {key: size}, least recently used first
+        self.total_bytes = 0
+        self.scanned_at = 0
+
+
+    def make_key(self, kind, *source_files, **params):
+        sources = []
+        for source_file in source_files:
+            stat = Path(source_file).stat()
+            sources.append([str(source_file), stat.st_mtime_ns, stat.st_size])
+        payload = json.dumps({"kind": kind, "sources": sources, "params": params}, sort_keys=True, default=str)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+    def get_path(self, key):
+        return self.cache_dir / key[:2] / f"{key}{self.suffix}"
+
+
+    def scan(self):
+        # Rebuild the LRU index from disk - other workers share the same directory
+        entries = []
+        if self.cache_dir.exists():
+            for path in self.cache_dir.glob(f"*/*{self.suffix}"):
+                try:
+                    stat = path.stat()
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, path.stem, stat.st_size))
+            # Leftovers of renders interrupted mid-write
+            for path in self.cache_dir.glob("*/.*.tmp"):
+                try:
+                    if time.time() - path.stat().st_mtime > 3600:
+                        path.unlink()
+                except FileNotFoundError:
+                    continue
+        entries.sort()
+        self.index = OrderedDict((key, size) for (_, key, size) in entries)
+        self.total_bytes = sum(self.index.values())
+        self.scanned_at = time.monotonic()
+
+
+    def ensure_index(self):
+        if self.index is None or time.monotonic() - self.scanned_at > self.rescan_seconds:
+            self.scan()
+
+
+    def get(self, key):
+        path = self.get_path(key)
+        try:
+            cached_file = open(path, "rb")
+        except FileNotFoundError:
+            return None
+        try:
+            os.utime(path) # mtime doubles as the LRU clock across workers
+        except FileNotFoundError:
+            pass
+        with self.lock:
+            self.ensure_index()
+            if key in self.index:
+                self.index.move_to_end(key)
+        return cached_file
+
+
+    def get_tmp_path(self, key):
+        path = self.get_path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        return path.with_name(f".{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+
+
+    def put_file(self, key, tmp_path):
+        # Publish a rendered temp file under its key and return an open handle to it
+        # The handle stays readable even if the entry is evicted while it is being streamed
+        rendered_file = open(tmp_path, "rb")
+        size = os.fstat(rendered_file.fileno()).st_size
+        if size > self.max_bytes:
+            os.unlink(tmp_path)
+            return rendered_file
+        os.replace(tmp_path, self.get_path(key)) # atomic - readers never see a partial file
+        with self.lock:
+            self.ensure_index()
+            self.total_bytes -= self.index.pop(key, 0)
+            self.index[key] = size
+            self.total_bytes += size
+            self.evict()
+        return rendered_file
+
+
+    def evict(self):
+        while self.total_bytes > self.max_bytes and self.index:
+            key, size = self.index.popitem(last=False)
+            self.total_bytes -= size
+            try:
+                self.get_path(key).unlink()
+            except FileNotFoundError:
+                pass
+
+
+
+render_cache = RenderCache()
@@ -0,0 +1,80 @@
+import math
+import threading
+import numpy as np
+from settings import env
+from api_lookups.models import LkpDistrict
+from api_layers.exceptions import LayerDataException
+from .boundary_store import boundary_store
+
+
+class ReverseGeocoder:
+    # lon/lat (one point or a batch) -> country/state/district ids, through the boundary store's STRtrees
+    # District features carry state_id + district name - resolved to LkpDistrict ids once per process
+    district_ids = None # {(state_id, district name): district id}
+    district_ids_lock = threading.Lock()
+
+    def __init__(self, **kwargs):
+        self.db = kwargs.get("db")
+        self.lon = kwargs.get("lon")
+        self.lat = kwargs.get("lat")
+        self.points = kwargs.get("points") # [[lon, lat], ...]
+        self.max_points = int(env.get("REVERSE_GEOCODE_MAX_POINTS") or 10000)
+
+
+    def get_coordinates(self):
+        # (lons, lats) float arrays
+        points = self.points if self.points is not None else [[self.lon, self.lat]]
+        if not isinstance(points, list) or not points:
+            raise LayerDataException("Please choose at least one location")
+        if len(points) > self.max_points:
+            raise LayerDataException(f"Please choose at most {self.max_points} locations")
+        try:
+            coordinates = np.array([[float(lon), float(lat)] for (lon, lat) in points], dtype="float64")
+        except (TypeError, ValueError):
+            raise LayerDataException("Please choose valid locations")
+        (lons, lats) = (coordinates[:, 0], coordinates[:, 1])
+        if not (np.isfinite(coordinates).all() and (np.abs(lons) <= 180).all() and (np.abs(lats) <= 90).all()):
+            raise LayerDataException("Please choose valid locations")
+        return (lons, lats)
+
+
+    def get_district_ids(self):
+        if ReverseGeocoder.district_ids is None:
+            with ReverseGeocoder.district_ids_lock:
+                if ReverseGeocoder.district_ids is None:
+                    rows = self.db.query(LkpDistrict.id, LkpDistrict.state_id, LkpDistrict.district).all()
+                    ReverseGeocoder.district_ids = {(row.state_id, row.district): row.id for row in rows}
+        return ReverseGeocoder.district_ids
+
+
+    def to_id(self, value):
+        return int(value) if value is not None and not (isinstance(value, float) and math.isnan(value)) else None
+
+
+    def execute(self):
+        (lons, lats) = self.get_coordinates()
+        districts = boundary_store.get_index("districts")
+        district_rows = districts.locate(lons, lats)
+        # Outside every district file (countries without district boundaries) - country only
+        countries = boundary_store.get_index("countries")
+        country_rows = np.full(len(lons), -1)
+        outside = district_rows < 0
+        if outside.any():
+            country_rows[outside] = countries.locate(lons[outside], lats[outside])
+        district_ids = self.get_district_ids()
+        locations = []
+        for (lon, lat, district_row, country_row) in zip(lons.tolist(), lats.tolist(), district_rows, country_rows):
+            location = {"lon": lon, "lat": lat, "country_id": None, "state_id": None, "district_id": None, "district": None}
+            if district_row >= 0:
+                district = districts.columns["district"][district_row]
+                state_id = self.to_id(districts.columns["state_id"][district_row])
+                location.update({
+                    "country_id": self.to_id(districts.columns["country_id"][district_row]),
+                    "state_id": state_id,
+                    "district_id": district_ids.get((state_id, district)),
+                    "district": district,
+                })
+            elif country_row >= 0:
+                location["country_id"] = self.to_id(countries.columns["country_id"][country_row])
+            locations.append(location)
+        return locations if self.points is not None else locations[0]
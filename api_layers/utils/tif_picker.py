@@ -8,7 +8,20 @@ from api_lookups.models import (
     LkpIntensityMetric, LkpChangeMetric # Currently specific only for hazards
 )
 from ..exceptions import LayerDataException
-import inflect
+from .raster_manifest import raster_manifest
+from functools import lru_cache
+
+
+# Top-level raster folders under DATA_ROOT_DIR resolved by the pickers
+RASTER_FOLDERS = ["Hazards-final-struc", "Impact-final-struc", "Adap-final-struc", "Crop Masks/Extent"]
+
+
+@lru_cache(maxsize=1)
+def get_inflect_engine():
+    # inflect takes seconds to import - deferred from worker boot to the first singular_noun call
+    import inflect
+    return inflect.engine()
+
 
 class TIFPicker:
     def __init__(self, **kwargs):
@@ -37,11 +50,10 @@ class TIFPicker:
         self.impact_obj = self.db.query(LkpImpact).filter(LkpImpact.id == self.impact_id).first()
         self.lcase = lambda s: re.sub(r'[^a-zA-Z0-9]', '', s).lower()
         self.ucase = lambda s: re.sub(r'[^a-zA-Z0-9]', '', s).upper()
-        self.p = inflect.engine()
         self.irregulars = {
             "Indices": "Index",
         }
-        self.singular = lambda s: self.irregulars.get(s, self.p.singular_noun(s) or s)
+        self.singular = lambda s: self.irregulars.get(s, get_inflect_engine().singular_noun(s) or s)
  
 
     
@@ -60,7 +72,7 @@ class TIFPicker:
                 "climate_scenario_id": 1,
                 "climate_scenario": "Baseline",
                 "source_file": (Path(parent_folder) / f"{self.commodity_obj.commodity}.tif").as_posix(),
-                "exists": Path.exists( self.data_root_dir / parent_folder / f"{self.commodity_obj.commodity}.tif"),
+                "exists": raster_manifest.exists( self.data_root_dir / parent_folder / f"{self.commodity_obj.commodity}.tif"),
                 "ramp": common_color_ramp,
             }]
         }
@@ -98,7 +110,7 @@ class TIFPicker:
                     "intensity_metric": intensity_metric_obj.metric,
                     "change_metric": change_metric_obj.metric,
                     "source_file": (Path(parent_folder)/ baseline_intm_folder / baseline_file).as_posix(),
-                    "exists": Path.exists(self.data_root_dir / parent_folder / baseline_intm_folder / baseline_file),
+                    "exists": raster_manifest.exists(self.data_root_dir / parent_folder / baseline_intm_folder / baseline_file),
                     "ramp": ramp,
                 })
         # Future scenarios
@@ -128,7 +140,7 @@ class TIFPicker:
                 "intensity_metric": intensity_metric_obj.metric,
                 "change_metric": change_metric_obj.metric,
                 "source_file": (Path(parent_folder)/ intm_folder / scenario_file).as_posix(),
-                "exists": Path.exists(self.data_root_dir / parent_folder / intm_folder / scenario_file),
+                "exists": raster_manifest.exists(self.data_root_dir / parent_folder / intm_folder / scenario_file),
                 "ramp": ramp if change_metric_id == 1 else delta_color_ramp
             })
         nonbaseline_scenario_ids = [row.id for row in self.db.query(LkpClimateScenario.id).filter(LkpClimateScenario.scenario != "Baseline").all()]
@@ -185,7 +197,7 @@ class TIFPicker:
                     "intensity_metric": intensity_metric_obj.metric,
                     "change_metric": change_metric_obj.metric,
                     "source_file": (Path(parent_folder)/ baseline_intm_folder / baseline_file).as_posix(),
-                    "exists": Path.exists(self.data_root_dir / parent_folder / baseline_intm_folder / baseline_file),
+                    "exists": raster_manifest.exists(self.data_root_dir / parent_folder / baseline_intm_folder / baseline_file),
                     "ramp": baseline_ramp,
                 })
         # Future scenarios
@@ -211,7 +223,7 @@ class TIFPicker:
                 "intensity_metric": intensity_metric_obj.metric,
                 "change_metric": change_metric_obj.metric,
                 "source_file": (Path(parent_folder)/ intm_folder / scenario_file).as_posix(),
-                "exists": Path.exists(self.data_root_dir / parent_folder / intm_folder / scenario_file),
+                "exists": raster_manifest.exists(self.data_root_dir / parent_folder / intm_folder / scenario_file),
                 "ramp": scn_ramp
             })
         nonbaseline_scenario_ids = [row.id for row in self.db.query(LkpClimateScenario.id).filter(LkpClimateScenario.scenario != "Baseline").all()]
@@ -272,7 +284,7 @@ class TIFPicker:
                         "intensity_metric": intensity_metric_obj.metric,
                         "change_metric": change_metric_obj.metric,
                         "source_file": (Path(impact_parent_folder)/ baseline_intm_folder / baseline_file).as_posix(),
-                        "exists": Path.exists(self.data_root_dir / impact_parent_folder / baseline_intm_folder / baseline_file),
+                        "exists": raster_manifest.exists(self.data_root_dir / impact_parent_folder / baseline_intm_folder / baseline_file),
                         "ramp": self.db.query(LkpImpactColor).filter(LkpImpactColor.suffix == "Productivity_baseline").first().ramp,
                     })
                 else:
@@ -289,7 +301,7 @@ class TIFPicker:
                         "intensity_metric": intensity_metric_obj.metric,
                         "change_metric": change_metric_obj.metric,
                         "source_file": (Path(parent_folder)/ baseline_intm_folder / baseline_file).as_posix(),
-                        "exists": Path.exists(self.data_root_dir / parent_folder / baseline_intm_folder / baseline_file),
+                        "exists": raster_manifest.exists(self.data_root_dir / parent_folder / baseline_intm_folder / baseline_file),
                         "ramp": cpfx_obj.ramp,
                     })
         # Future scenarios
@@ -314,7 +326,7 @@ class TIFPicker:
                 "intensity_metric": intensity_metric_obj.metric,
                 "change_metric": change_metric_obj.metric,
                 "source_file": (Path(parent_folder)/ intm_folder / scenario_file).as_posix(),
-                "exists": Path.exists(self.data_root_dir / parent_folder / intm_folder / scenario_file),
+                "exists": raster_manifest.exists(self.data_root_dir / parent_folder / intm_folder / scenario_file),
                 "ramp": cpfx_obj.ramp,
             })
         nonbaseline_scenario_ids = [row.id for row in self.db.query(LkpClimateScenario.id).filter(LkpClimateScenario.scenario != "Baseline").all()]
@@ -365,7 +377,7 @@ class TIFPicker:
                     "intensity_metric": intensity_metric_obj.metric,
                     "change_metric": change_metric_obj.metric,
                     "source_file": (Path(parent_folder)/ baseline_intm_folder / baseline_file).as_posix(),
-                    "exists": Path.exists(self.data_root_dir / parent_folder / baseline_intm_folder / baseline_file),
+                    "exists": raster_manifest.exists(self.data_root_dir / parent_folder / baseline_intm_folder / baseline_file),
                     "ramp": lsufx_obj.ramp,
                 })
         # Future scenarios
@@ -389,7 +401,7 @@ class TIFPicker:
                 "intensity_metric": intensity_metric_obj.metric,
                 "change_metric": change_metric_obj.metric,
                 "source_file": (Path(parent_folder)/ intm_folder / scenario_file).as_posix(),
-                "exists": Path.exists(self.data_root_dir / parent_folder / intm_folder / scenario_file),
+                "exists": raster_manifest.exists(self.data_root_dir / parent_folder / intm_folder / scenario_file),
                 "ramp": lsufx_obj.ramp,
             })
         nonbaseline_scenario_ids = [row.id for row in self.db.query(LkpClimateScenario.id).filter(LkpClimateScenario.scenario != "Baseline").all()]
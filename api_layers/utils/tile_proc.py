@@ -0,0 +1,137 @@
+import threading
+import numpy as np
+from io import BytesIO
+from PIL import Image
+from rasterio.coords import disjoint_bounds
+from rasterio.enums import Resampling
+from rasterio.features import geometry_mask
+from rasterio.transform import from_bounds
+from rasterio.vrt import WarpedVRT
+from rasterio.warp import transform_bounds, transform_geom
+from rasterio.windows import bounds as window_bounds
+from api_layers.exceptions import NoRasterDataException, LayerDataException
+from .geo_proc import GeoProc
+from .palettes import colorize_band
+from .dataset_pool import dataset_pool
+
+
+WEB_MERCATOR = "EPSG:3857"
+WEB_MERCATOR_ORIGIN = 20037508.342789244
+
+
+class TileProc(GeoProc):
+    # Admin region geometries reprojected to web mercator - {(admin_level, admin_level_id): [geometry]}
+    mercator_geoms = {}
+    mercator_geoms_lock = threading.Lock()
+    # Encoded fully transparent tile per format
+    empty_tiles = {}
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.z = kwargs.get("z")
+        self.x = kwargs.get("x")
+        self.y = kwargs.get("y")
+        self.tile_size = 256
+        self.tile_format = str(kwargs.get("tile_format") or "png").lower()
+        self.media_types = {"png": "image/png", "webp": "image/webp"}
+
+
+    def get_media_type(self):
+        return self.media_types[self.tile_format]
+
+
+    def get_tile_bounds(self):
+        tile_span = 2 * WEB_MERCATOR_ORIGIN / 2 ** self.z
+        left = -WEB_MERCATOR_ORIGIN + self.x * tile_span
+        top = WEB_MERCATOR_ORIGIN - self.y * tile_span
+        return (left, top - tile_span, left + tile_span, top)
+
+
+    def get_mercator_geoms(self):
+        geoms_key = (self.admin_level, str(self.admin_level_id))
+        geoms = TileProc.mercator_geoms.get(geoms_key)
+        if geoms is None:
+            geoms = [transform_geom("EPSG:4326", WEB_MERCATOR, geom) for geom in self.get_region_geoms()]
+            with TileProc.mercator_geoms_lock:
+                TileProc.mercator_geoms[geoms_key] = geoms
+        return geoms
+
+
+    def get_overview_level(self, src, tile_bounds):
+        # Deepest overview still at least as fine as the tile's pixel size; None = full resolution
+        left, bottom, right, top = transform_bounds(WEB_MERCATOR, src.crs, *tile_bounds)
+        tile_resolution = (right - left) / self.tile_size
+        overview_level = None
+        for (level, factor) in enumerate(src.overviews(1)):
+            if src.res[0] * factor <= tile_resolution:
+                overview_level = level
+        return overview_level
+
+
+    def encode(self, rgba):
+        buffer = BytesIO()
+        image = Image.fromarray(rgba, "RGBA")
+        if self.tile_format == "webp":
+            image.save(buffer, format="WEBP", lossless=True)
+        else:
+            image.save(buffer, format="PNG")
+        return buffer.getvalue()
+
+
+    def get_empty_tile(self):
+        if self.tile_format not in TileProc.empty_tiles:
+            TileProc.empty_tiles[self.tile_format] = self.encode(
+                np.zeros((self.tile_size, self.tile_size, 4), dtype=np.uint8)
+            )
+        return TileProc.empty_tiles[self.tile_format]
+
+
+    def get_tile_cache_key(self):
+        # Validated inputs -> key of the tile's inputs (source file version, region, boundaries), base of the ETag
+        if self.tile_format not in self.media_types:
+            raise LayerDataException("Please choose an appropriate tile format (png/webp)")
+        if not (0 <= self.z <= 24 and 0 <= self.x < 2 ** self.z and 0 <= self.y < 2 ** self.z):
+            raise LayerDataException("Please request a valid tile")
+        if not self.color_ramp:
+            raise LayerDataException("Please provide a color ramp for the layer")
+        return self.get_cache_key(
+            "tile", z=self.z, x=self.x, y=self.y, color_ramp=self.color_ramp, tile_format=self.tile_format
+        )
+
+
+    def prep_tile(self):
+        self.get_tile_cache_key()
+        tile_bounds = self.get_tile_bounds()
+        with dataset_pool.open(self.source_file) as src:
+            # Skip tiles outside the region's bbox without touching pixels
+            try:
+                region_mask = self.get_region_mask(src)
+            except NoRasterDataException:
+                return self.get_empty_tile()
+            region_bounds = transform_bounds(
+                src.crs, WEB_MERCATOR, *window_bounds(region_mask.window, src.transform)
+            )
+            if disjoint_bounds(region_bounds, tile_bounds):
+                return self.get_empty_tile()
+            overview_level = self.get_overview_level(src, tile_bounds)
+            nodata = src.nodata
+        # Re-open at the chosen overview level so the warp reads the smallest sufficient pyramid
+        open_options = {} if overview_level is None else {"overview_level": overview_level}
+        with dataset_pool.open(self.source_file, **open_options) as src:
+            tile_transform = from_bounds(*tile_bounds, self.tile_size, self.tile_size)
+            with WarpedVRT(
+                src, crs=WEB_MERCATOR, transform=tile_transform,
+                width=self.tile_size, height=self.tile_size,
+                resampling=Resampling.nearest, # categorical data
+            ) as vrt:
+                tile_band = vrt.read(1)
+        outside_region = geometry_mask(
+            self.get_mercator_geoms(), out_shape=tile_band.shape, transform=tile_transform
+        )
+        nodata_mask = np.isnan(tile_band) | (tile_band == 0)
+        if nodata is not None and not np.isnan(nodata):
+            nodata_mask |= tile_band == nodata
+        tile_masked = np.ma.masked_where(outside_region | nodata_mask, tile_band)
+        if tile_masked.mask.all():
+            return self.get_empty_tile()
+        return self.encode(colorize_band(tile_masked, self.color_ramp))
@@ -0,0 +1,124 @@
+import threading
+import numpy as np
+from collections import OrderedDict
+from pathlib import Path
+from rasterio.enums import Resampling
+from rasterio.windows import bounds as window_bounds, from_bounds
+from api_lookups.models import LkpCommodity
+from api_layers.exceptions import LayerDataException, RasterFileNotFoundException
+from .geo_proc import GeoProc
+from .render_cache import render_cache
+from .dataset_pool import dataset_pool
+
+
+EARTH_RADIUS = 6371008.8 # metres, mean radius
+MAX_CLASSES = 256
+
+
+def get_row_areas(transform, crs, row_off, height):
+    # Pixel area in hectares for each row of a window (varies with latitude on geographic grids)
+    if crs is not None and crs.is_geographic:
+        lats = np.radians(transform.f + transform.e * (row_off + np.arange(height + 1)))
+        area = EARTH_RADIUS ** 2 * np.radians(abs(transform.a)) * np.abs(np.diff(np.sin(lats)))
+    else:
+        area = np.full(height, abs(transform.a * transform.e))
+    return area / 10_000
+
+
+def read_aligned(path, bounds, shape):
+    # Values of another raster on the given bounds/shape; resampled (nearest) when it is on another grid
+    with dataset_pool.open(path) as src:
+        values = src.read(
+            1, window=from_bounds(*bounds, transform=src.transform), out_shape=shape,
+            resampling=Resampling.nearest, boundless=True, fill_value=0,
+        ).astype("float64")
+        if src.nodata is not None:
+            values[values == src.nodata] = 0
+    return values
+
+
+def summarize_classes(band, valid, row_areas, weights=None):
+    # Per-class pixel counts, area (ha) and optional weighted sums via np.bincount over valid pixels
+    valid = valid & (band >= 0) & (band < MAX_CLASSES)
+    if not np.issubdtype(band.dtype, np.integer):
+        valid &= band == np.floor(band) # continuous values are not classes
+    rows, cols = np.nonzero(valid)
+    class_values = band[rows, cols].astype(np.int64)
+    pixel_counts = np.bincount(class_values, minlength=MAX_CLASSES)
+    areas = np.bincount(class_values, weights=row_areas[rows], minlength=MAX_CLASSES)
+    weighted = (
+        np.bincount(class_values, weights=np.nan_to_num(weights[rows, cols]), minlength=MAX_CLASSES)
+        if weights is not None else None
+    )
+    return [{
+        "class_value": int(value),
+        "pixel_count": int(pixel_counts[value]),
+        "area_ha": float(areas[value]),
+        "weighted_value": float(weighted[value]) if weighted is not None else None,
+    } for value in np.flatnonzero(pixel_counts)]
+
+
+class ZonalStats(GeoProc):
+    # Results keyed by inputs + source/weight file stamps - {key: result}, least recently used first
+    results = OrderedDict()
+    results_lock = threading.Lock()
+    max_results = 2048
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.commodity_id = kwargs.get("commodity_id")
+        self.weight_file = None
+        if self.commodity_id:
+            # Commodity extent raster, same convention as TIFPicker.pick_commodity_raster
+            commodity_obj = self.db.query(LkpCommodity).filter(LkpCommodity.id == self.commodity_id).first()
+            if not commodity_obj:
+                raise LayerDataException("Please choose a valid commodity")
+            self.weight_file = self.tif_data_dir / "Crop Masks/Extent" / f"{commodity_obj.commodity}.tif"
+
+
+    def read_weights(self, window, transform, shape):
+        if not Path(self.weight_file).exists():
+            raise RasterFileNotFoundException("The commodity extent raster is unavailable")
+        return read_aligned(self.weight_file, window_bounds(window, transform), shape)
+
+
+    def compute(self):
+        with dataset_pool.open(self.source_file) as src:
+            region_mask = self.get_region_mask(src)
+            band = src.read(1, window=region_mask.window)
+            row_areas = get_row_areas(src.transform, src.crs, int(region_mask.window.row_off), band.shape[0])
+            # 0, NaN and nodata are no data - as on the map (read_masked_band) and in the point samples
+            valid = region_mask.inside & ~np.isnan(band) & (band != 0)
+            if src.nodata is not None and not np.isnan(src.nodata):
+                valid &= band != src.nodata
+            weights = (
+                self.read_weights(region_mask.window, src.transform, band.shape)
+                if self.weight_file else None
+            )
+        return {
+            "region": self.get_region(),
+            "source_file": Path(self.source_file).relative_to(self.tif_data_dir).as_posix(),
+            "weight_file": Path(self.weight_file).relative_to(self.tif_data_dir).as_posix() if self.weight_file else None,
+            "classes": summarize_classes(band, valid, row_areas, weights),
+        }
+
+
+    def execute(self):
+        self.check_source_file()
+        weight_files = [self.weight_file] if self.weight_file and Path(self.weight_file).exists() else []
+        result_key = render_cache.make_key(
+            "zonal_stats", self.source_file, *weight_files,
+            admin_level=self.admin_level,
+            admin_level_id=str(self.admin_level_id),
+            weight_file=str(self.weight_file),
+        )
+        with ZonalStats.results_lock:
+            if result_key in ZonalStats.results:
+                ZonalStats.results.move_to_end(result_key)
+                return ZonalStats.results[result_key]
+        result = self.compute()
+        with ZonalStats.results_lock:
+            ZonalStats.results[result_key] = result
+            while len(ZonalStats.results) > ZonalStats.max_results:
+                ZonalStats.results.popitem(last=False)
+        return result
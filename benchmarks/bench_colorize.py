@@ -0,0 +1,60 @@
+# Microbenchmark: per-class loop colorization (previous GeoProc.prep_geotiff) vs palette lookup
+# USAGE: python -m benchmarks.bench_colorize [--size 4000] [--classes 5] [--repeat 5]
+import argparse
+import time
+import numpy as np
+from api_layers.utils.palettes import hex_to_rgba, colorize_band
+
+
+RAMP = ["#FFFFCC", "#FFE680", "#FFCC33", "#FF9933", "#CC6600"]
+
+
+def colorize_loop(masked_band, hex_colors):
+    rgba = np.zeros((masked_band.shape[0], masked_band.shape[1], 4), dtype=np.uint8)
+    unique_vals = np.unique(masked_band.compressed()).astype(int)
+    for val in unique_vals:
+        idx = val - 1
+        if 0 <= idx < len(hex_colors):
+            rgba[masked_band == val] = hex_to_rgba(hex_colors[idx])
+    rgba[masked_band.mask] = [0, 0, 0, 0]
+    return rgba
+
+
+def make_band(size, n_classes):
+    # Categorical float32 band with NaN/0 nodata, roughly like a clipped state raster
+    rng = np.random.default_rng(42)
+    band = rng.integers(0, n_classes + 1, (size, size)).astype("float32")
+    band[rng.random((size, size)) < 0.3] = np.nan
+    return np.ma.masked_where(np.isnan(band) | (band == 0), band)
+
+
+def best_of(fn, repeat):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - started)
+    return min(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--size", type=int, default=4000, help="Band width/height in pixels")
+    parser.add_argument("--classes", type=int, default=5)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    ramp = (RAMP * ((args.classes // len(RAMP)) + 1))[:args.classes]
+    masked_band = make_band(args.size, args.classes)
+    if not np.array_equal(colorize_loop(masked_band, ramp), colorize_band(masked_band, ramp)):
+        raise SystemExit("Palette output differs from the loop output")
+    loop_seconds = best_of(lambda: colorize_loop(masked_band, ramp), args.repeat)
+    lut_seconds = best_of(lambda: colorize_band(masked_band, ramp), args.repeat)
+    print(f"{args.size}x{args.size} px, {args.classes} classes (best of {args.repeat})")
+    print(f"  loop    : {loop_seconds * 1000:8.1f} ms")
+    print(f"  palette : {lut_seconds * 1000:8.1f} ms")
+    print(f"  speedup : {loop_seconds / lut_seconds:8.1f}x")
+
+
+if __name__ == "__main__":
+    main()
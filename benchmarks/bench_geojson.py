@@ -0,0 +1,99 @@
+# Benchmark: /layers/geojson response building - read + reserialize per request vs boundary store bytes,
+# then payload size / client-side decode time per output format (geojson, flatgeobuf, geoarrow)
+# USAGE: python -m benchmarks.bench_geojson [--admin-level state] [--admin-level-id 90] [--repeat 20]
+import argparse
+import json
+import time
+from io import BytesIO
+import geopandas as gpd
+import pyarrow as pa
+from fastapi.responses import JSONResponse
+from api_layers.utils.boundary_store import boundary_store
+
+
+def build_read_file(path, fields):
+    # Previous GeoProc.prep_geojson: parse the file, to_json, json.loads, then FastAPI re-encodes the dict
+    gdf = gpd.read_file(path)
+    data = {**fields, "bbox": gdf.total_bounds.tolist(), "geojson": json.loads(gdf.to_json())}
+    return JSONResponse({"success": 1, "data": data}).body
+
+
+def build_reserialize(boundary, fields):
+    # Store lookup, but the GeoJSON still decoded and re-encoded per request
+    data = {**fields, "bbox": boundary.bbox, "geojson": json.loads(boundary.geojson_bytes)}
+    return JSONResponse({"success": 1, "data": data}).body
+
+
+def decode_geojson(body):
+    return gpd.GeoDataFrame.from_features(json.loads(body)["data"]["geojson"]["features"])
+
+
+def decode_flatgeobuf(body):
+    return gpd.read_file(BytesIO(body))
+
+
+def decode_geoarrow(body):
+    return gpd.GeoDataFrame.from_arrow(pa.ipc.open_stream(body).read_all())
+
+
+def measure(fn, repeat):
+    # (best wall ms, mean CPU ms, response bytes)
+    walls, cpus = [], []
+    for _ in range(repeat):
+        (wall_started, cpu_started) = (time.perf_counter(), time.process_time())
+        body = fn()
+        walls.append(time.perf_counter() - wall_started)
+        cpus.append(time.process_time() - cpu_started)
+    return (min(walls) * 1000, sum(cpus) / len(cpus) * 1000, len(body))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--admin-level", default="state", choices=["total", "country", "state"])
+    parser.add_argument("--admin-level-id", type=int, default=90)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    paths = {
+        "total": "sa_outline.geojson",
+        "country": f"sa_countries/country_{args.admin_level_id}.geojson",
+        "state": f"sa_states/state_{args.admin_level_id}.geojson",
+    }
+    path = boundary_store.geojson_data_dir / paths[args.admin_level]
+    boundary = boundary_store.get(args.admin_level, args.admin_level_id)
+    if boundary is None:
+        raise SystemExit(f"No boundary file: {path}")
+    fields = {"region": ["Benchmark"], "bbox": boundary.bbox}
+    if json.loads(boundary.get_body(fields)) != json.loads(build_read_file(path, {"region": ["Benchmark"]})):
+        raise SystemExit("Pre-serialized body differs from the read_file response")
+    for encoding in ["gzip", "br"]:
+        boundary.get_body(fields, encoding) # compressed once, outside the timings
+
+    cases = [
+        ("read_file + reserialize", lambda: build_read_file(path, {"region": ["Benchmark"]})),
+        ("store dict + reserialize", lambda: build_reserialize(boundary, {"region": ["Benchmark"]})),
+        ("store bytes", lambda: boundary.get_body(fields)),
+        ("store bytes (gzip)", lambda: boundary.get_body(fields, "gzip")),
+        ("store bytes (br)", lambda: boundary.get_body(fields, "br")),
+    ]
+    unit = args.admin_level if args.admin_level == "total" else f"{args.admin_level} {args.admin_level_id}"
+    print(f"{unit} ({path.name}), {args.repeat} requests")
+    print(f"  {'path':<26}{'best ms':>10}{'cpu ms':>10}{'bytes':>12}")
+    for (name, fn) in cases:
+        (wall_ms, cpu_ms, size) = measure(fn, args.repeat)
+        print(f"  {name:<26}{wall_ms:>10.2f}{cpu_ms:>10.2f}{size:>12,}")
+
+    payloads = [
+        ("geojson", lambda encoding=None: boundary.get_body(fields, encoding), decode_geojson),
+        ("flatgeobuf", lambda encoding=None: boundary.get_binary("flatgeobuf", encoding), decode_flatgeobuf),
+        ("geoarrow", lambda encoding=None: boundary.get_binary("geoarrow", encoding), decode_geoarrow),
+    ]
+    print(f"\n  {'format':<26}{'decode ms':>10}{'bytes':>12}{'gzip':>12}{'br':>12}")
+    for (name, get_payload, decode) in payloads:
+        body = get_payload()
+        (decode_ms, _, _) = measure(lambda: decode(body), args.repeat)
+        (gzip_size, br_size) = [len(get_payload(encoding)) for encoding in ["gzip", "br"]]
+        print(f"  {name:<26}{decode_ms:>10.2f}{len(body):>12,}{gzip_size:>12,}{br_size:>12,}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+# Startup benchmark: API worker boot time (interpreter + `import main` + lifespan startup) against a budget
+# Exits 1 when the best boot exceeds --budget-ms or a deferred dependency is imported at boot - usable as a CI check
+# USAGE: python -m benchmarks.bench_startup [--budget-ms 1500] [--repeat 5] [--top 15]
+import argparse
+import subprocess
+import sys
+import time
+from settings import ROOT_DIR
+
+
+# Heavy dependencies only imported on first use (api_layers.utils, TIFPicker, the boundary store thread)
+DEFERRED_MODULES = ["geopandas", "pandas", "rasterio", "shapely", "openpyxl", "PIL", "inflect", "mapbox_vector_tile", "brotli", "pyarrow"]
+
+BOOT_SCRIPT = """
+import asyncio, sys, time
+started = time.perf_counter()
+import main
+imported = time.perf_counter()
+boot_modules = sorted(sys.modules)
+async def start():
+    async with main.app.router.lifespan_context(main.app):
+        pass
+asyncio.run(start())
+print(f"{(imported - started) * 1000:.1f} {(time.perf_counter() - started) * 1000:.1f}")
+print(",".join(boot_modules))
+"""
+
+
+def run_boot():
+    # (process wall ms, import ms, import + lifespan ms, modules imported by `import main`)
+    started = time.perf_counter()
+    result = subprocess.run([sys.executable, "-c", BOOT_SCRIPT], cwd=ROOT_DIR, capture_output=True, text=True, check=True)
+    wall_ms = (time.perf_counter() - started) * 1000
+    (timings, modules) = result.stdout.strip().splitlines()[-2:]
+    (import_ms, startup_ms) = [float(value) for value in timings.split()]
+    return (wall_ms, import_ms, startup_ms, set(modules.split(",")))
+
+
+def get_importtime_report():
+    # [(cumulative us, self us, module)] from `python -X importtime -c "import main"`, slowest first
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import main"], cwd=ROOT_DIR, capture_output=True, text=True, check=True
+    )
+    rows = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        (self_us, cumulative_us, module) = line.removeprefix("import time:").split("|")
+        rows.append((int(cumulative_us), int(self_us), module.rstrip()))
+    return sorted(rows, reverse=True)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--budget-ms", type=float, default=1500, help="Max best-of-repeat worker boot time")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--top", type=int, default=15, help="Slowest imports listed in the report")
+    args = parser.parse_args()
+
+    runs = [run_boot() for _ in range(args.repeat)]
+    (wall_ms, import_ms, startup_ms, boot_modules) = min(runs)
+    print(f"Worker boot (best of {args.repeat})")
+    print(f"  import main         : {import_ms:8.1f} ms")
+    print(f"  + lifespan startup  : {startup_ms:8.1f} ms")
+    print(f"  process wall        : {wall_ms:8.1f} ms   (budget {args.budget_ms:.0f} ms)")
+
+    print(f"\nSlowest imports (-X importtime, cumulative)")
+    for (cumulative_us, self_us, module) in get_importtime_report()[:args.top]:
+        print(f"  {cumulative_us / 1000:8.1f} ms  (self {self_us / 1000:6.1f} ms)  {module}")
+
+    failures = []
+    if wall_ms > args.budget_ms:
+        failures.append(f"boot took {wall_ms:.0f} ms, over the {args.budget_ms:.0f} ms budget")
+    eager_modules = [module for module in DEFERRED_MODULES if module in boot_modules]
+    if eager_modules:
+        failures.append(f"imported at boot: {', '.join(eager_modules)}")
+    for failure in failures:
+        print(f"\nFAIL: {failure}")
+    if failures:
+        sys.exit(1)
+    print("\nOK")
+
+
+if __name__ == "__main__":
+    main()
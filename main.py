@@ -1,3 +1,5 @@
+import threading
+from contextlib import asynccontextmanager
 from fastapi import FastAPI, Request
 from fastapi.exceptions import RequestValidationError
 from fastapi.responses import JSONResponse
@@ -13,7 +15,24 @@ from api_analytics.exceptions import AnalyticsDataException
 
 
 
-app = FastAPI(root_path="/acasa_srilanka_api")
+def warm_up():
+    # DATA_ROOT_DIR walk for the pickers' existence checks - otherwise run by the first (async) picker request
+    from api_layers.utils.raster_manifest import raster_manifest
+    raster_manifest.ensure_loaded()
+    # geopandas + parsing every boundary file - imported here, off the boot path
+    from api_layers.utils.boundary_store import boundary_store
+    boundary_store.ensure_loaded()
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Raster manifest and boundary store built in the background: the worker serves requests right away,
+    # lookups made before they finish wait for them (RasterManifest/BoundaryStore.ensure_loaded)
+    threading.Thread(target=warm_up, name="warm-up", daemon=True).start()
+    yield
+
+
+app = FastAPI(root_path="/acasa_srilanka_api", lifespan=lifespan)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
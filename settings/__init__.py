@@ -1,6 +1,13 @@
+import os
 from pathlib import Path
 from dotenv import dotenv_values
 
 
 ROOT_DIR = Path(__file__).resolve().parent.parent
 env = dict(dotenv_values())
+
+# GDAL reads its tuning options from the process environment
+# e.g. GDAL_CACHEMAX=512 (MB of raster block cache per worker), GDAL_NUM_THREADS=ALL_CPUS
+for gdal_option in ["GDAL_CACHEMAX", "GDAL_NUM_THREADS"]:
+    if env.get(gdal_option):
+        os.environ.setdefault(gdal_option, env[gdal_option])